@@ -1,2 +1,10 @@
 from . import models
-from . import controllers
\ No newline at end of file
+from . import controllers
+from . import tools
+from odoo.tools import config, str2bool
+
+
+def post_load():
+    # Only called when the module is server wide (--load=base,web,kedatech_test_material)
+    if str2bool(config.get('kedatech_async_logging', 'False')):
+        tools.log_utils.install_async_handlers()
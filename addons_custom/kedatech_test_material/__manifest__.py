@@ -6,9 +6,14 @@
     ],
     'author': 'Ali Shidqie Al Faruqi',
     'data': [
+        'security/ir.model.access.csv',
+        'data/kedatech_material_sequence.xml',
+        'data/kedatech_material_cron.xml',
         'views/kedatech_material_views.xml',
+        'views/kedatech_material_import_views.xml',
     ],
     # 'images': ['static/description/icon.png'],
+    'post_load': 'post_load',
     'installable': True,
     'application': True,
 }
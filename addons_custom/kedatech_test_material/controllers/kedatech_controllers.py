@@ -1,184 +1,1198 @@
-from odoo import http
+from odoo import api, fields, http
+from odoo.exceptions import UserError
 from odoo.http import request, Response
+import base64
+import csv
+import hashlib
+import io
 import json
 import logging
+from collections import defaultdict
+
+from ..tools import compression, material_cache, metrics
 
 _logger = logging.getLogger(__name__)
 
+# Public API key -> kedatech.material field
+MATERIAL_API_FIELDS = {
+    'id': 'id',
+    'code': 'material_code_kedatech',
+    'name': 'name',
+    'type': 'material_type_kedatech',
+    'price': 'material_price_kedatech',
+    'currency': 'currency_id_kedatech',
+    'company_price': 'material_price_company',
+    'supplier': 'supplier_id_kedatech',
+    'write_date': 'write_date',
+}
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+EXPORT_CHUNK_SIZE = 2000
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 100
+MAX_BATCH_OPERATIONS = 1000
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+# sort= values of the list endpoint -> order, keyset paginated on (price, id)
+PRICE_SORTS = {
+    'company_price': 'material_price_company asc, id',
+    '-company_price': 'material_price_company desc, id',
+}
+# group_by= key -> kedatech.material field for /stats
+STATS_GROUP_BY = {
+    'type': 'material_type_kedatech',
+    'supplier': 'supplier_id_kedatech',
+}
+JSON_SEPARATORS = (',', ':')
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _json_response(payload, status=200):
+    """Serialize ``payload`` as compact JSON, compressed when the client accepts it."""
+    headers = [('Vary', 'Accept-Encoding')]
+    with metrics.measure_serialization():
+        body = json.dumps(payload, separators=JSON_SEPARATORS).encode()
+        encoding = compression.negotiate(request.httprequest.accept_encodings)
+        if encoding and len(body) >= compression.MIN_SIZE:
+            body = compression.compress(body, encoding)
+            headers.append(('Content-Encoding', encoding))
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+
+def _parse_api_fields(fields_param):
+    """Parse a comma separated ``fields=`` parameter into API keys."""
+    if not fields_param:
+        return list(MATERIAL_API_FIELDS)
+    api_fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    unknown = [f for f in api_fields if f not in MATERIAL_API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return api_fields
+
+
+def _read_materials(Material, domain, api_fields, limit=None, order='id'):
+    """Return the materials matching ``domain`` as API dicts.
+
+    The page is loaded with one ``search`` + ``read`` and supplier names are
+    resolved with a single batched lookup, so the query count does not depend
+    on the number of rows. The ``id`` key is always present.
+    """
+    model_fields = [MATERIAL_API_FIELDS[f] for f in api_fields if f != 'id']
+    records = Material.search(domain, limit=limit, order=order)
+    if not model_fields:
+        # read([]) would load every stored field
+        return [{'id': material_id} for material_id in records.ids]
+    rows = records.read(model_fields, load=None)
+
+    supplier_names = {}
+    if 'supplier' in api_fields:
+        supplier_ids = {row['supplier_id_kedatech'] for row in rows if row['supplier_id_kedatech']}
+        supplier_names = {
+            partner['id']: partner['name']
+            for partner in Material.env['res.partner'].browse(list(supplier_ids)).read(['name'])
+        }
+    currency_names = {}
+    if 'currency' in api_fields:
+        currency_ids = {row['currency_id_kedatech'] for row in rows if row['currency_id_kedatech']}
+        currency_names = {
+            currency['id']: currency['name']
+            for currency in Material.env['res.currency'].browse(list(currency_ids)).read(['name'])
+        }
+
+    materials_data = []
+    for row in rows:
+        data = {'id': row['id']}
+        for api_field in api_fields:
+            if api_field == 'id':
+                continue
+            value = row[MATERIAL_API_FIELDS[api_field]]
+            if api_field == 'supplier':
+                value = supplier_names.get(value) if value else None
+            elif api_field == 'currency':
+                value = currency_names.get(value) if value else None
+            elif api_field == 'write_date':
+                value = fields.Datetime.to_string(value)
+            data[api_field] = value
+        materials_data.append(data)
+    return materials_data
+
+
+def _read_material_stats(Material, domain, group_by):
+    """Return count and min/avg/max company currency price per group, aggregated in SQL."""
+    groups = Material.read_group(domain, [
+        'min_price:min(material_price_company)',
+        'avg_price:avg(material_price_company)',
+        'max_price:max(material_price_company)',
+    ], [STATS_GROUP_BY[key] for key in group_by], lazy=False)
+
+    stats = []
+    for group in groups:
+        data = {}
+        for key in group_by:
+            value = group[STATS_GROUP_BY[key]]
+            if key == 'supplier':
+                value = {'id': value[0], 'name': value[1]} if value else None
+            data[key] = value
+        data.update({
+            'count': group['__count'],
+            'min_price': group['min_price'],
+            'avg_price': group['avg_price'],
+            'max_price': group['max_price'],
+        })
+        stats.append(data)
+    return stats
+
+
+def _get_currency(env, code):
+    """Return the currency of ISO ``code`` for ``?currency=``, or raise ``ValueError``."""
+    currency = env['res.currency'].sudo().with_context(active_test=False).search([('name', '=', code.upper())], limit=1)
+    if not currency:
+        raise ValueError(f"Unknown currency: {code}")
+    return currency
+
+
+def _company_price_ratio(Material, currency):
+    """Return the ratio converting company currency prices into ``currency``."""
+    company = Material.env.company
+    return Material._get_conversion_ratios(
+        [company.currency_id.id], currency, company, fields.Date.today())[company.currency_id.id]
+
+
+def _encode_sync_token(material_cursor, tombstone_cursor):
+    token = json.dumps({'m': list(material_cursor), 't': list(tombstone_cursor)})
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def _decode_sync_token(token):
+    """Return the ``(txid, id)`` cursors of materials and tombstones of ``token``."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return tuple(map(int, data['m'])), tuple(map(int, data['t']))
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid sync token")
+
+
+def _not_modified(etag, last_modified):
+    """Return a 304 response if the request validators match, else ``None``.
+
+    ``If-None-Match`` takes precedence over ``If-Modified-Since`` as per
+    RFC 7232. ``last_modified`` is a naive UTC datetime or ``None``.
+    """
+    httprequest = request.httprequest
+    if httprequest.if_none_match:
+        not_modified = httprequest.if_none_match.contains_weak(etag)
+    elif httprequest.if_modified_since and last_modified:
+        since = httprequest.if_modified_since.replace(tzinfo=None)
+        not_modified = last_modified.replace(microsecond=0) <= since
+    else:
+        not_modified = False
+    if not not_modified:
+        return None
+    return _set_validators(Response(status=304), etag, last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients may keep the body but must revalidate it before reuse
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _prepare_material_vals(request_data):
+    """Convert one API material payload into ``kedatech.material`` create values."""
+    if not isinstance(request_data, dict):
+        raise ValueError("Material payload must be a JSON object")
+    required_fields = ['name', 'type', 'price']
+    for field in required_fields:
+        if field not in request_data:
+            raise ValueError(f"Missing required field: {field}")
+    try:
+        price = float(request_data['price'])
+    except (TypeError, ValueError):
+        raise ValueError("Price must be a number")
+    return {
+        'name': request_data['name'],
+        'material_type_kedatech': request_data['type'],
+        'material_price_kedatech': price,
+        'supplier_id_kedatech': request_data.get('supplier_id')
+    }
+
+
+def _prepare_material_update_vals(request_data):
+    """Convert the changed keys of an API payload into ``kedatech.material`` write values."""
+    if not isinstance(request_data, dict):
+        raise ValueError("Material payload must be a JSON object")
+    update_vals = {}
+    if 'name' in request_data:
+        update_vals['name'] = request_data['name']
+    if 'type' in request_data:
+        update_vals['material_type_kedatech'] = request_data['type']
+    if 'price' in request_data:
+        try:
+            update_vals['material_price_kedatech'] = float(request_data['price'])
+        except (TypeError, ValueError):
+            raise ValueError("Price must be a number")
+    if 'supplier_id' in request_data:
+        update_vals['supplier_id_kedatech'] = request_data['supplier_id']
+    return update_vals
+
+
+def _parse_bulk_ids(items):
+    """Return the material ids of a bulk payload, rejecting invalid and duplicate ids."""
+    ids = []
+    seen = set()
+    for index, material_id in enumerate(items):
+        if isinstance(material_id, bool) or not isinstance(material_id, int):
+            raise ValueError(f"Item {index}: id must be an integer")
+        if material_id in seen:
+            raise ValueError(f"Item {index}: duplicate id {material_id}")
+        seen.add(material_id)
+        ids.append(material_id)
+    return ids
+
+
+def _get_material_data(Material, material_id):
+    """Return the API dict of a material through the payload cache, ``None`` if it does not exist."""
+    data = material_cache.lookup(Material.env.cr, material_cache.payload_cache, (Material.env.cr.dbname, material_id))
+    if data is None:
+        data = _load_material_data(Material, material_id)
+    return data
+
+
+def _load_material_data(Material, material_id):
+    """Read the API dict of a material and put it in the payload cache, ``None`` if it does not exist."""
+    materials_data = _read_materials(Material, [('id', '=', material_id)], list(MATERIAL_API_FIELDS))
+    if not materials_data:
+        return None
+    data = materials_data[0]
+    material_cache.store(Material.env.cr, material_cache.payload_cache, (Material.env.cr.dbname, material_id), data)
+    return data
+
+
+def _prefetch_material_data(Material, material_ids):
+    """Return ``{id: API dict}`` of the existing materials of ``material_ids``.
+
+    Entries missing from the payload cache are read with one query and
+    stored, instead of one query per material.
+    """
+    cr = Material.env.cr
+    materials_data, missing = {}, []
+    for material_id in material_ids:
+        data = material_cache.lookup(cr, material_cache.payload_cache, (cr.dbname, material_id))
+        if data is None:
+            missing.append(material_id)
+        else:
+            materials_data[material_id] = data
+    if missing:
+        for data in _read_materials(Material, [('id', 'in', missing)], list(MATERIAL_API_FIELDS)):
+            material_cache.store(cr, material_cache.payload_cache, (cr.dbname, data['id']), data)
+            materials_data[data['id']] = data
+    return materials_data
+
+
+def _get_material_write_date(Material, material_id):
+    """Return the ``write_date`` string of a material with one query, ``None`` if it does not exist."""
+    Material.flush(['write_date'])
+    Material.env.cr.execute("SELECT write_date FROM kedatech_material WHERE id = %s", [material_id])
+    row = Material.env.cr.fetchone()
+    return fields.Datetime.to_string(row[0]) if row else None
+
+
+# Core of the single material routes, shared with /api/materials/batch.
+# Each returns the ``(payload, status)`` of the reply.
+
+def _create_material(Material, request_data):
+    try:
+        vals = _prepare_material_vals(request_data)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    material = Material.create(vals)
+    return {'success': True, 'material_id': material.id}, 201
+
+
+def _update_material(material, request_data):
+    try:
+        update_vals = _prepare_material_update_vals(request_data)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    material.write(update_vals)
+    return {'success': True, 'message': 'Material updated successfully', 'material_id': material.id}, 200
+
+
+def _delete_material(material):
+    material.unlink()
+    return {'success': True, 'message': 'Material deleted successfully'}, 200
+
+
+def _parse_batch_operations(operations):
+    """Validate the sub-operations of a batch payload, raising ``ValueError``."""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("Expected a non-empty list of operations")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise ValueError(f"Operation {index}: must be a JSON object")
+        if operation.get('method') not in BATCH_METHODS:
+            raise ValueError(f"Operation {index}: method must be one of {', '.join(BATCH_METHODS)}")
+        material_id = operation.get('id')
+        if operation['method'] != 'POST' and (isinstance(material_id, bool) or not isinstance(material_id, int)):
+            raise ValueError(f"Operation {index}: id must be an integer")
+    return operations
+
+
+def _run_batch_operation(Material, operation, existing_ids, materials_data):
+    """Run one batch sub-operation and return its ``(payload, status)``.
+
+    ``existing_ids`` holds the ids known to exist and is kept up to date as
+    materials are created and deleted. ``materials_data`` holds the API dicts
+    prefetched for the GET operations; an entry is dropped once a PUT or a
+    DELETE touches its material. Writes run in a savepoint so that a failing
+    operation is undone without affecting the others.
+    """
+    method, material_id = operation['method'], operation.get('id')
+    if method == 'GET':
+        data = None
+        if material_id in existing_ids:
+            data = materials_data.get(material_id) or _get_material_data(Material, material_id)
+        if data is None:
+            return {'success': False, 'error': 'Material not found'}, 404
+        return {'success': True, 'data': data}, 200
+    if method != 'POST' and material_id not in existing_ids:
+        return {'success': False, 'error': 'Material not found'}, 404
+
+    materials_data.pop(material_id, None)
+    try:
+        with Material.env.cr.savepoint():
+            if method == 'POST':
+                payload, status = _create_material(Material, operation.get('body'))
+                if status == 201:
+                    existing_ids.add(payload['material_id'])
+            elif method == 'PUT':
+                payload, status = _update_material(Material.browse(material_id), operation.get('body'))
+            else:
+                payload, status = _delete_material(Material.browse(material_id))
+                existing_ids.discard(material_id)
+    except Exception as e:
+        _logger.warning("Batch operation %s %s failed: %s", method, material_id or '', str(e))
+        return {'success': False, 'error': str(e)}, 500
+    return payload, status
+
+
+def _import_job_data(job):
+    return {
+        'id': job.id,
+        'name': job.name,
+        'state': job.state,
+        'rows_done': job.rows_done,
+        'error': job.error or None,
+    }
+
+
+def _export_materials(registry, uid, context, domain, api_fields, export_format):
+    """Yield the encoded export of every material matching ``domain``.
+
+    The export runs on its own cursor and environments because the request
+    cursor is already closed, and the request's ``Environment.manage()``
+    block left, when werkzeug consumes the response. Rows are read in id
+    ordered chunks of ``EXPORT_CHUNK_SIZE`` and the record cache is dropped
+    after each chunk, so memory stays flat whatever the table size.
+    """
+    with api.Environment.manage(), registry.cursor() as cr:
+        Material = api.Environment(cr, uid, context)['kedatech.material'].sudo()
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(api_fields)
+            yield buffer.getvalue().encode()
+
+        last_id = 0
+        while True:
+            rows = _read_materials(
+                Material, domain + [('id', '>', last_id)], api_fields, limit=EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([row.get(f) for f in api_fields] for row in rows)
+                yield buffer.getvalue().encode()
+            else:
+                yield ''.join(
+                    json.dumps({f: row.get(f) for f in api_fields}, separators=JSON_SEPARATORS) + '\n' for row in rows
+                ).encode()
+
+            Material.invalidate_cache()
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                break
+
+
 class KedatechMaterialController(http.Controller):
 
     @http.route('/api/materials', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
     def list_materials(self, **kwargs):
         try:
+            try:
+                limit = int(kwargs.get('limit', DEFAULT_PAGE_LIMIT))
+                after_id = int(kwargs.get('after_id', 0))
+                after_price = float(kwargs['after_price']) if 'after_price' in kwargs else None
+                min_price = float(kwargs['min_price']) if kwargs.get('min_price') else None
+                max_price = float(kwargs['max_price']) if kwargs.get('max_price') else None
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'limit and after_id must be integers, after_price, min_price and max_price numbers'
+                }, status=400)
+            if not 0 < limit <= MAX_PAGE_LIMIT:
+                return _json_response({
+                    'success': False,
+                    'error': f"limit must be between 1 and {MAX_PAGE_LIMIT}"
+                }, status=400)
+
+            sort = kwargs.get('sort')
+            if sort and sort not in PRICE_SORTS:
+                return _json_response({
+                    'success': False,
+                    'error': f"sort must be one of {', '.join(PRICE_SORTS)}"
+                }, status=400)
+            if sort and after_id and after_price is None:
+                return _json_response({
+                    'success': False,
+                    'error': 'after_price is required with after_id when sorting by price'
+                }, status=400)
+
+            try:
+                api_fields = _parse_api_fields(kwargs.get('fields'))
+                currency = _get_currency(request.env, kwargs['currency']) if kwargs.get('currency') else None
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+
+            Material = request.env['kedatech.material'].sudo()
+
+            # Price bounds are given in the requested currency, compared in the company one
+            ratio = _company_price_ratio(Material, currency) if currency else 1.0
+            if sort and after_price is not None:
+                # Keyset cursor on (price, id): rows after the last one of the previous page
+                domain = [
+                    '|', ('material_price_company', '<' if sort.startswith('-') else '>', after_price),
+                    '&', ('material_price_company', '=', after_price), ('id', '>', after_id),
+                ]
+            else:
+                domain = [('id', '>', after_id)]
+            if kwargs.get('type'):
+                domain.append(('material_type_kedatech', '=', kwargs['type']))
+            if kwargs.get('code'):
+                domain.append(('material_code_kedatech', '=', kwargs['code']))
+            if min_price is not None:
+                domain.append(('material_price_company', '>=', min_price / ratio))
+            if max_price is not None:
+                domain.append(('material_price_company', '<=', max_price / ratio))
+
+            # Validators come from one aggregate query over the page's keyset
+            # range, so it costs the same on every page; a 304 never reads any record
+            order = PRICE_SORTS.get(sort, 'id')
+            page_query, page_params = Material._search(domain, limit=limit, order=order).select(
+                '"kedatech_material"."id"', '"kedatech_material"."write_date"')
+            request.env.cr.execute(
+                f"SELECT count(*), max(write_date), sum(id) FROM ({page_query}) AS page", page_params)
+            count, last_modified, ids_sum = request.env.cr.fetchone()
+            etag = hashlib.sha1(repr((
+                count, str(last_modified), ids_sum, sorted(kwargs.items()), ratio,
+            )).encode()).hexdigest()
+            not_modified = _not_modified(etag, last_modified)
+            if not_modified:
+                return not_modified
+
+            read_fields = list(api_fields)
+            if (sort or currency) and 'company_price' not in read_fields:
+                read_fields.append('company_price')
+            materials_data = _read_materials(Material, domain, read_fields, limit=limit, order=order)
+
+            # Keyset cursor: a full page means there may be more rows after the last id
+            next_cursor = materials_data[-1]['id'] if len(materials_data) == limit else None
+            next_price = materials_data[-1]['company_price'] if sort and next_cursor else None
+            for row in materials_data:
+                if currency:
+                    row['converted_price'] = currency.round(row['company_price'] * ratio)
+                if 'company_price' not in api_fields:
+                    del row['company_price']
+                if 'id' not in api_fields:
+                    del row['id']
+
+            result = {
+                'success': True,
+                'count': len(materials_data),
+                'data': materials_data,
+                'next_cursor': next_cursor,
+            }
+            if sort:
+                result['next_price_cursor'] = next_price
+            if currency:
+                result['currency'] = currency.name
+            return _set_validators(_json_response(result), etag, last_modified)
+
+        except Exception as e:
+            _logger.exception("Failed to fetch materials: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/export', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
+    def export_materials(self, **kwargs):
+        export_format = kwargs.get('format', 'ndjson')
+        if export_format not in EXPORT_MIMETYPES:
+            return _json_response({
+                'success': False,
+                'error': f"Unsupported format: {export_format}"
+            }, status=400)
+        try:
+            api_fields = _parse_api_fields(kwargs.get('fields'))
+        except ValueError as e:
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        domain = []
+        if kwargs.get('type'):
+            domain.append(('material_type_kedatech', '=', kwargs['type']))
+
+        env = request.env
+        stream = _export_materials(
+            env.registry, env.uid, dict(env.context), domain, api_fields, export_format)
+        headers = [
+            ('Content-Disposition', f'attachment; filename=materials.{export_format}'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        encoding = compression.negotiate(request.httprequest.accept_encodings)
+        if encoding:
+            stream = compression.compress_stream(stream, encoding)
+            headers.append(('Content-Encoding', encoding))
+        return Response(stream, status=200, mimetype=EXPORT_MIMETYPES[export_format], headers=headers,
+                        direct_passthrough=True)
+
+    @http.route('/api/materials/import', type='http', auth='user', methods=['POST'], csrf=False)
+    @metrics.instrumented
+    def import_materials(self, **kwargs):
+        try:
+            upload = kwargs.get('file')
+            if not hasattr(upload, 'read') or not upload.filename:
+                return _json_response({
+                    'success': False,
+                    'error': 'Missing file upload'
+                }, status=400)
+            vals = {
+                'name': upload.filename,
+                'import_file': base64.b64encode(upload.read()),
+            }
+            if kwargs.get('chunk_size'):
+                try:
+                    vals['chunk_size'] = int(kwargs['chunk_size'])
+                except ValueError:
+                    return _json_response({
+                        'success': False,
+                        'error': 'chunk_size must be an integer'
+                    }, status=400)
+            if kwargs.get('create_missing_suppliers'):
+                vals['create_missing_suppliers'] = kwargs['create_missing_suppliers'].lower() in ('1', 'true')
+
+            job = request.env['kedatech.material.import'].create(vals)
+            job.action_run()
+            return _json_response({
+                'success': job.state == 'done',
+                'data': _import_job_data(job)
+            }, status=201)
+
+        except Exception as e:
+            _logger.exception("Failed to import materials: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/import/<int:job_id>', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
+    def get_import_job(self, job_id, **kwargs):
+        job = request.env['kedatech.material.import'].browse(job_id).exists()
+        if not job:
+            return _json_response({
+                'success': False,
+                'error': 'Import not found'
+            }, status=404)
+        return _json_response({
+            'success': True,
+            'data': _import_job_data(job)
+        })
+
+    @http.route('/api/materials/import/<int:job_id>/resume', type='http', auth='user', methods=['POST'], csrf=False)
+    @metrics.instrumented
+    def resume_import_job(self, job_id, **kwargs):
+        try:
+            job = request.env['kedatech.material.import'].browse(job_id).exists()
+            if not job:
+                return _json_response({
+                    'success': False,
+                    'error': 'Import not found'
+                }, status=404)
+
+            try:
+                job.action_run()
+            except UserError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=409)
+            return _json_response({
+                'success': job.state == 'done',
+                'data': _import_job_data(job)
+            })
+
+        except Exception as e:
+            _logger.exception("Failed to resume material import %s: %s", job_id, str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/changes', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
+    def material_changes(self, **kwargs):
+        try:
+            try:
+                limit = int(kwargs.get('limit', DEFAULT_PAGE_LIMIT))
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'limit must be an integer'
+                }, status=400)
+            if not 0 < limit <= MAX_PAGE_LIMIT:
+                return _json_response({
+                    'success': False,
+                    'error': f"limit must be between 1 and {MAX_PAGE_LIMIT}"
+                }, status=400)
+
+            Material = request.env['kedatech.material'].sudo()
+            Tombstone = request.env['kedatech.material.tombstone'].sudo()
+            if kwargs.get('since'):
+                try:
+                    material_cursor, tombstone_cursor = _decode_sync_token(kwargs['since'])
+                except ValueError as e:
+                    return _json_response({
+                        'success': False,
+                        'error': str(e)
+                    }, status=400)
+            else:
+                # Initial sync: every live row, none of the past deletions.
+                # Deletions not committed yet have a txid from the horizon on.
+                material_cursor = (0, 0)
+                tombstone_cursor = (Tombstone._get_sync_horizon(), 0)
+
+            # Cursors follow commit order rather than write_date, which is
+            # the start time of a transaction that may commit much later
+            changed = Material._get_changed_since(*material_cursor, limit)
+            changes = []
+            if changed:
+                material_cursor = changed[-1]
+                records = {
+                    material['id']: material
+                    for material in _read_materials(
+                        Material, [('id', 'in', [material_id for _txid, material_id in changed])],
+                        list(MATERIAL_API_FIELDS))
+                }
+                changes = [records[material_id] for _txid, material_id in changed]
+
+            tombstones = Tombstone._get_deleted_since(*tombstone_cursor, limit)
+            deleted = [{
+                'id': tombstone['material_id'],
+                'code': tombstone['material_code_kedatech'],
+                'deleted_date': fields.Datetime.to_string(tombstone['deleted_date']),
+            } for tombstone in tombstones]
+            if tombstones:
+                tombstone_cursor = (tombstones[-1]['sync_txid'], tombstones[-1]['id'])
+
+            return _json_response({
+                'success': True,
+                'changes': changes,
+                'deleted': deleted,
+                'next_token': _encode_sync_token(material_cursor, tombstone_cursor),
+                'has_more': len(changed) == limit or len(tombstones) == limit,
+            })
+
+        except Exception as e:
+            _logger.exception("Failed to fetch material changes: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/stats', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
+    def material_stats(self, **kwargs):
+        try:
+            group_by = [key.strip() for key in kwargs.get('group_by', 'type').split(',') if key.strip()]
+            unknown = [key for key in group_by if key not in STATS_GROUP_BY]
+            if unknown:
+                return _json_response({
+                    'success': False,
+                    'error': f"Unknown group_by: {', '.join(unknown)}"
+                }, status=400)
+
             domain = []
             if kwargs.get('type'):
                 domain.append(('material_type_kedatech', '=', kwargs['type']))
 
-            materials = request.env['kedatech.material'].sudo().search(domain)
+            cache_key = (request.env.cr.dbname, repr(domain), tuple(group_by))
+            stats = material_cache.lookup(request.env.cr, material_cache.stats_cache, cache_key)
+            if stats is None:
+                stats = _read_material_stats(request.env['kedatech.material'].sudo(), domain, group_by)
+                material_cache.store(request.env.cr, material_cache.stats_cache, cache_key, stats)
+
+            return _json_response({
+                'success': True,
+                'group_by': group_by,
+                'data': stats
+            })
+
+        except Exception as e:
+            _logger.exception("Failed to compute material stats: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/search', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
+    def search_materials(self, **kwargs):
+        try:
+            query = (kwargs.get('q') or '').strip()
+            if not query:
+                return _json_response({
+                    'success': False,
+                    'error': 'q is required'
+                }, status=400)
+            try:
+                limit = int(kwargs.get('limit', DEFAULT_SEARCH_LIMIT))
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'limit must be an integer'
+                }, status=400)
+            if not 0 < limit <= MAX_SEARCH_LIMIT:
+                return _json_response({
+                    'success': False,
+                    'error': f"limit must be between 1 and {MAX_SEARCH_LIMIT}"
+                }, status=400)
+            try:
+                api_fields = _parse_api_fields(kwargs.get('fields'))
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+
+            Material = request.env['kedatech.material'].sudo()
+            # Ranking is the expensive part and is what gets cached; the rows
+            # are read fresh so that the cache only ever holds ids and scores
+            cache_key = (request.env.cr.dbname, query.lower(), limit)
+            ranked = material_cache.lookup(request.env.cr, material_cache.search_cache, cache_key)
+            if ranked is None:
+                ranked = Material._search_similar(query, limit)
+                material_cache.store(request.env.cr, material_cache.search_cache, cache_key, ranked)
 
-            materials_data = []
-            for material in materials:
-                materials_data.append({
-                    'id': material.id,
-                    'code': material.material_code_kedatech,
-                    'name': material.name,
-                    'type': material.material_type_kedatech,
-                    'price': material.material_price_kedatech,
-                    'supplier': material.supplier_id_kedatech.name if material.supplier_id_kedatech else None,
-                })
+            scores = dict(ranked)
+            materials_data = _read_materials(Material, [('id', 'in', list(scores))], api_fields)
+            position = {material_id: index for index, (material_id, score) in enumerate(ranked)}
+            materials_data.sort(key=lambda row: position[row['id']])
+            for row in materials_data:
+                row['score'] = scores[row['id']]
+                if 'id' not in api_fields:
+                    del row['id']
 
-            return Response(json.dumps({
+            return _json_response({
                 'success': True,
                 'count': len(materials_data),
                 'data': materials_data
-            }), status=200, mimetype='application/json')
+            })
 
         except Exception as e:
-            _logger.exception("Failed to fetch materials: %s", str(e))
-            return Response(json.dumps({
+            _logger.exception("Failed to search materials: %s", str(e))
+            return _json_response({
                 'success': False,
                 'error': str(e)
-            }), status=500, mimetype='application/json')
+            }, status=500)
+
+    @http.route('/api/materials/_metrics', type='http', auth='user', methods=['GET'], csrf=False)
+    def material_metrics(self, **kwargs):
+        return _json_response({
+            'success': True,
+            'data': metrics.snapshot()
+        })
+
+    @http.route('/api/materials/_cache', type='http', auth='user', methods=['GET'], csrf=False)
+    def material_cache_stats(self, **kwargs):
+        return _json_response({
+            'success': True,
+            'data': material_cache.stats()
+        })
 
     @http.route('/api/materials/<int:material_id>', type='http', auth='user', methods=['GET'], csrf=False)
+    @metrics.instrumented
     def get_material(self, material_id, **kwargs):
         try:
-            material = request.env['kedatech.material'].sudo().browse(material_id)
-            if not material.exists():
-                return Response(json.dumps({
+            try:
+                currency = _get_currency(request.env, kwargs['currency']) if kwargs.get('currency') else None
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+
+            Material = request.env['kedatech.material'].sudo()
+            data = material_cache.lookup(
+                request.env.cr, material_cache.payload_cache, (request.env.cr.dbname, material_id))
+            # On a miss the validators come from write_date alone, a 304 never loads the record
+            write_date = data['write_date'] if data else _get_material_write_date(Material, material_id)
+            if write_date is None:
+                return _json_response({
                     'success': False,
                     'error': 'Material not found'
-                }), status=404, mimetype='application/json')
-
-            data = {
-                'id': material.id,
-                'code': material.material_code_kedatech,
-                'name': material.name,
-                'type': material.material_type_kedatech,
-                'price': material.material_price_kedatech,
-                'supplier': material.supplier_id_kedatech.name if material.supplier_id_kedatech else None,
-            }
+                }, status=404)
+
+            etag = f"{material_id}-{write_date}"
+            if currency:
+                # Cached payloads are shared by every currency, the conversion is per request
+                ratio = _company_price_ratio(Material, currency)
+                etag = f"{etag}-{currency.name}-{ratio}"
+            last_modified = fields.Datetime.to_datetime(write_date)
+            not_modified = _not_modified(etag, last_modified)
+            if not_modified:
+                return not_modified
+
+            if data is None:
+                data = _load_material_data(Material, material_id)
+                if data is None:
+                    return _json_response({
+                        'success': False,
+                        'error': 'Material not found'
+                    }, status=404)
+            if currency:
+                data = dict(data, converted_price=currency.round(data['company_price'] * ratio))
 
-            return Response(json.dumps({
+            return _set_validators(_json_response({
                 'success': True,
                 'data': data
-            }), status=200, mimetype='application/json')
+            }), etag, last_modified)
 
         except Exception as e:
             _logger.exception("Failed to get material %s: %s", material_id, str(e))
-            return Response(json.dumps({
+            return _json_response({
                 'success': False,
                 'error': str(e)
-            }), status=500, mimetype='application/json')
+            }, status=500)
 
     @http.route('/api/materials', type='http', auth='user', methods=['POST'], csrf=False)
+    @metrics.instrumented
     def create_material(self, **kwargs):
         try:
             try:
                 request_data = json.loads(request.httprequest.data)
             except ValueError:
-                return Response(json.dumps({
+                return _json_response({
+                    'success': False,
+                    'error': 'Invalid JSON body'
+                }, status=400)
+
+            payload, status = _create_material(request.env['kedatech.material'].sudo(), request_data)
+            return _json_response(payload, status=status)
+
+        except Exception as e:
+            _logger.exception("Failed to create material: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/batch', type='http', auth='user', methods=['POST'], csrf=False)
+    @metrics.instrumented
+    def batch_materials(self, **kwargs):
+        try:
+            try:
+                request_data = json.loads(request.httprequest.data)
+            except ValueError:
+                return _json_response({
                     'success': False,
                     'error': 'Invalid JSON body'
-                }), status=400, mimetype='application/json')
+                }, status=400)
+
+            if isinstance(request_data, dict):
+                request_data = request_data.get('operations')
+            try:
+                operations = _parse_batch_operations(request_data)
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+
+            Material = request.env['kedatech.material'].sudo()
+            # One read for every material fetched by the batch, one existence
+            # check for the ones it only writes
+            get_ids = {operation['id'] for operation in operations if operation['method'] == 'GET'}
+            write_ids = {
+                operation['id'] for operation in operations if operation['method'] in ('PUT', 'DELETE')
+            } - get_ids
+            materials_data = _prefetch_material_data(Material, list(get_ids))
+            existing_ids = set(materials_data)
+            if write_ids:
+                existing_ids.update(Material.browse(list(write_ids)).exists().ids)
+
+            results = []
+            for index, operation in enumerate(operations):
+                payload, status = _run_batch_operation(Material, operation, existing_ids, materials_data)
+                results.append({'index': index, 'status': status, 'body': payload})
+
+            return _json_response({
+                'success': True,
+                'count': len(results),
+                'failed': sum(1 for result in results if result['status'] >= 400),
+                'results': results
+            })
 
-            required_fields = ['name', 'type', 'price']
-            for field in required_fields:
-                if field not in request_data:
-                    return Response(json.dumps({
+        except Exception as e:
+            _logger.exception("Failed to run material batch: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/bulk', type='http', auth='user', methods=['POST'], csrf=False)
+    @metrics.instrumented
+    def bulk_create_materials(self, **kwargs):
+        try:
+            try:
+                request_data = json.loads(request.httprequest.data)
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'Invalid JSON body'
+                }, status=400)
+
+            if isinstance(request_data, dict):
+                request_data = request_data.get('materials')
+            if not isinstance(request_data, list) or not request_data:
+                return _json_response({
+                    'success': False,
+                    'error': 'Expected a non-empty list of materials'
+                }, status=400)
+
+            vals_list = []
+            for index, item in enumerate(request_data):
+                try:
+                    vals_list.append(_prepare_material_vals(item))
+                except ValueError as e:
+                    return _json_response({
                         'success': False,
-                        'error': f"Missing required field: {field}"
-                    }), status=400, mimetype='application/json')
+                        'error': f"Item {index}: {e}"
+                    }, status=400)
 
-            vals = {
-                'name': request_data['name'],
-                'material_type_kedatech': request_data['type'],
-                'material_price_kedatech': float(request_data['price']),
-                'supplier_id_kedatech': request_data.get('supplier_id')
-            }
+            # Rows are inserted before the constraints run, a failure must undo them all
+            with request.env.cr.savepoint():
+                materials = request.env['kedatech.material'].sudo().create(vals_list)
+            return _json_response({
+                'success': True,
+                'count': len(materials),
+                'material_ids': materials.ids
+            }, status=201)
+
+        except Exception as e:
+            _logger.exception("Failed to bulk create materials: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
+
+    @http.route('/api/materials/bulk', type='http', auth='user', methods=['PATCH'], csrf=False)
+    @metrics.instrumented
+    def bulk_update_materials(self, **kwargs):
+        try:
+            try:
+                request_data = json.loads(request.httprequest.data)
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'Invalid JSON body'
+                }, status=400)
+
+            if isinstance(request_data, dict):
+                request_data = request_data.get('materials')
+            if not isinstance(request_data, list) or not request_data:
+                return _json_response({
+                    'success': False,
+                    'error': 'Expected a non-empty list of materials'
+                }, status=400)
+            try:
+                ids = _parse_bulk_ids([item.get('id') if isinstance(item, dict) else None for item in request_data])
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
 
-            material = request.env['kedatech.material'].sudo().create(vals)
-            return Response(json.dumps({
+            Material = request.env['kedatech.material'].sudo()
+            existing_ids = set(Material.browse(ids).exists().ids)
+
+            # Records sharing the same change set are written together
+            results = {}
+            groups = defaultdict(list)
+            for material_id, item in zip(ids, request_data):
+                if material_id not in existing_ids:
+                    results[material_id] = {'id': material_id, 'success': False, 'error': 'Material not found'}
+                    continue
+                try:
+                    update_vals = _prepare_material_update_vals({k: v for k, v in item.items() if k != 'id'})
+                except ValueError as e:
+                    results[material_id] = {'id': material_id, 'success': False, 'error': str(e)}
+                    continue
+                groups[tuple(sorted(update_vals.items()))].append(material_id)
+
+            written = Material.browse()
+            for change_set, group_ids in groups.items():
+                records = Material.browse(group_ids)
+                try:
+                    # Constraints run once per write over the whole group
+                    with request.env.cr.savepoint():
+                        records.write(dict(change_set))
+                except Exception as e:
+                    _logger.warning("Bulk update of materials %s failed: %s", group_ids, str(e))
+                    results.update({
+                        material_id: {'id': material_id, 'success': False, 'error': str(e)}
+                        for material_id in group_ids
+                    })
+                    continue
+                written |= records
+                results.update({material_id: {'id': material_id, 'success': True} for material_id in group_ids})
+
+            return _json_response({
                 'success': True,
-                'material_id': material.id
-            }), status=201, mimetype='application/json')
+                'updated': len(written),
+                'failed': len(ids) - len(written),
+                'results': [results[material_id] for material_id in ids]
+            })
 
         except Exception as e:
-            _logger.exception("Failed to create material: %s", str(e))
-            return Response(json.dumps({
+            _logger.exception("Failed to bulk update materials: %s", str(e))
+            return _json_response({
                 'success': False,
                 'error': str(e)
-            }), status=500, mimetype='application/json')
+            }, status=500)
+
+    @http.route('/api/materials/bulk', type='http', auth='user', methods=['DELETE'], csrf=False)
+    @metrics.instrumented
+    def bulk_delete_materials(self, **kwargs):
+        try:
+            try:
+                request_data = json.loads(request.httprequest.data)
+            except ValueError:
+                return _json_response({
+                    'success': False,
+                    'error': 'Invalid JSON body'
+                }, status=400)
+
+            if isinstance(request_data, dict):
+                request_data = request_data.get('ids')
+            if not isinstance(request_data, list) or not request_data:
+                return _json_response({
+                    'success': False,
+                    'error': 'Expected a non-empty list of ids'
+                }, status=400)
+            try:
+                ids = _parse_bulk_ids(request_data)
+            except ValueError as e:
+                return _json_response({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
+
+            materials = request.env['kedatech.material'].sudo().browse(ids).exists()
+            existing_ids = set(materials.ids)
+            materials.unlink()
+
+            return _json_response({
+                'success': True,
+                'deleted': len(existing_ids),
+                'failed': len(ids) - len(existing_ids),
+                'results': [
+                    {'id': material_id, 'success': True} if material_id in existing_ids
+                    else {'id': material_id, 'success': False, 'error': 'Material not found'}
+                    for material_id in ids
+                ]
+            })
+
+        except Exception as e:
+            _logger.exception("Failed to bulk delete materials: %s", str(e))
+            return _json_response({
+                'success': False,
+                'error': str(e)
+            }, status=500)
 
     @http.route('/api/materials/<int:material_id>', type='http', auth='user', methods=['PUT'], csrf=False)
+    @metrics.instrumented
     def update_material(self, material_id, **kwargs):
         try:
             material = request.env['kedatech.material'].sudo().browse(material_id)
             if not material.exists():
-                return Response(json.dumps({
+                return _json_response({
                     'success': False,
                     'error': 'Material not found'
-                }), status=404, mimetype='application/json')
+                }, status=404)
 
             try:
                 request_data = json.loads(request.httprequest.data)
             except ValueError:
-                return Response(json.dumps({
+                return _json_response({
                     'success': False,
                     'error': 'Invalid JSON data'
-                }), status=400, mimetype='application/json')
-
-            update_vals = {}
-            if 'name' in request_data:
-                update_vals['name'] = request_data['name']
-            if 'type' in request_data:
-                update_vals['material_type_kedatech'] = request_data['type']
-            if 'price' in request_data:
-                try:
-                    update_vals['material_price_kedatech'] = float(request_data['price'])
-                except ValueError:
-                    return Response(json.dumps({
-                        'success': False,
-                        'error': 'Price must be a number'
-                    }), status=400, mimetype='application/json')
-            if 'supplier_id' in request_data:
-                update_vals['supplier_id_kedatech'] = request_data['supplier_id']
+                }, status=400)
 
-            material.write(update_vals)
-
-            return Response(json.dumps({
-                'success': True,
-                'message': 'Material updated successfully',
-                'material_id': material.id
-            }), status=200, mimetype='application/json')
+            payload, status = _update_material(material, request_data)
+            return _json_response(payload, status=status)
 
         except Exception as e:
             _logger.exception("Failed to update material %s: %s", material_id, str(e))
-            return Response(json.dumps({
+            return _json_response({
                 'success': False,
                 'error': str(e)
-            }), status=500, mimetype='application/json')
+            }, status=500)
 
     @http.route('/api/materials/<int:material_id>', type='http', auth='user', methods=['DELETE'], csrf=False)
+    @metrics.instrumented
     def delete_material(self, material_id, **kwargs):
         try:
             material = request.env['kedatech.material'].sudo().browse(material_id)
             if not material.exists():
-                return Response(json.dumps({
+                return _json_response({
                     'success': False,
                     'error': 'Material not found'
-                }), status=404, mimetype='application/json')
-
-            material.unlink()
+                }, status=404)
 
-            return Response(json.dumps({
-                'success': True,
-                'message': 'Material deleted successfully'
-            }), status=200, mimetype='application/json')
+            payload, status = _delete_material(material)
+            return _json_response(payload, status=status)
 
         except Exception as e:
             _logger.exception("Failed to delete material %s: %s", material_id, str(e))
-            return Response(json.dumps({
+            return _json_response({
                 'success': False,
                 'error': str(e)
-            }), status=500, mimetype='application/json')
\ No newline at end of file
+            }, status=500)
\ No newline at end of file
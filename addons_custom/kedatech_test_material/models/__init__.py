@@ -1 +1,4 @@
-from . import kedatech_materials
\ No newline at end of file
+from . import kedatech_materials
+from . import kedatech_material_tombstone
+from . import kedatech_material_import
+from . import res_currency_rate
\ No newline at end of file
@@ -0,0 +1,213 @@
+from odoo import models, fields, api, _ # type: ignore
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+import base64
+import csv
+import io
+import itertools
+import logging
+import psycopg2
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+_logger = logging.getLogger(__name__)
+
+# Spreadsheet header -> material key, same layout as kedatech.material.xlsx
+IMPORT_COLUMNS = {
+    'Material Name': 'name',
+    'Material Type': 'type',
+    'Material Buy Price': 'price',
+    'Currency': 'currency',
+    "Supplier's Name": 'supplier',
+}
+
+class KedatechMaterialImport(models.Model):
+    _name = 'kedatech.material.import'
+    _description = 'Material Import'
+    _order = 'id desc'
+
+    name = fields.Char(string="File Name", required=True)
+    import_file = fields.Binary(string="File", attachment=True, required=True)
+    chunk_size = fields.Integer(string="Chunk Size", default=1000, required=True)
+    create_missing_suppliers = fields.Boolean(
+        string="Create Missing Suppliers", default=False,
+        help="Create a contact for supplier names that do not match any existing partner.")
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], string="Status", default='draft', required=True, readonly=True, copy=False)
+    rows_done = fields.Integer(string="Rows Imported", readonly=True, copy=False,
+        help="Data rows committed so far, a resumed import starts after them.")
+    error = fields.Text(string="Error", readonly=True, copy=False)
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for record in self:
+            if record.chunk_size < 1:
+                raise ValidationError(_('Chunk Size must be positive.'))
+
+    def action_run(self):
+        for job in self:
+            job._run()
+        return True
+
+    def _run(self):
+        """Import the remaining rows chunk by chunk.
+
+        Each chunk is created in a savepoint together with the progress
+        counter and committed, so a failure only loses the chunk in progress
+        and running the job again resumes from ``rows_done``. The job row is
+        locked for the whole run, and again after each commit, so that the
+        same job never imports its remaining rows twice at once.
+        """
+        self.ensure_one()
+        if not self._try_lock():
+            raise UserError(_('Import %s is already running.') % self.name)
+        if self.state == 'done':
+            return
+        self.write({'state': 'running', 'error': False})
+        if not self._commit_and_relock():
+            return
+
+        Material = self.env['kedatech.material']
+        suppliers = {}
+        currencies = {}
+        rows = itertools.islice(self._iter_rows(), self.rows_done, None)
+        try:
+            for chunk in split_every(self.chunk_size, rows):
+                with self.env.cr.savepoint():
+                    vals_list = self._prepare_chunk_vals(chunk, self.rows_done, suppliers, currencies)
+                    Material.create(vals_list)
+                    self.rows_done += len(chunk)
+                if not self._commit_and_relock():
+                    return
+                Material.invalidate_cache()
+                _logger.info("Material import %s: %s rows imported", self.id, self.rows_done)
+        except Exception as e:
+            # Drop the cached values of the rolled back chunk before recording the failure
+            self.env.clear()
+            _logger.warning("Material import %s failed after %s rows: %s", self.id, self.rows_done, str(e))
+            self.write({'state': 'failed', 'error': str(e)})
+            self._commit()
+            return
+        self.state = 'done'
+        self._commit()
+
+    def _commit(self):
+        # Tests run in a single transaction that must not be committed
+        if not self.env.registry.in_test_mode():
+            self.env.cr.commit()
+
+    def _try_lock(self):
+        """Lock the job row until the end of the transaction, ``False`` if another run holds it."""
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute(
+                    "SELECT id FROM kedatech_material_import WHERE id = %s FOR UPDATE NOWAIT", [self.id])
+        except psycopg2.OperationalError:
+            return False
+        # Another run may have made progress before the lock was taken
+        self.invalidate_cache(['state', 'rows_done'])
+        return True
+
+    def _commit_and_relock(self):
+        """Commit the progress and take the lock back, ``False`` if another run took over the job."""
+        rows_done = self.rows_done
+        self._commit()
+        if not self._try_lock() or self.rows_done != rows_done:
+            _logger.info("Material import %s was taken over by another run", self.id)
+            return False
+        return True
+
+    def _prepare_chunk_vals(self, chunk, offset, suppliers, currencies):
+        """Build the create values of ``chunk``, resolving names with one lookup per chunk.
+
+        ``suppliers`` and ``currencies`` map names to ids and are shared by the
+        chunks of a run, so only names not seen before are searched.
+        """
+        self._resolve_names(
+            'res.partner', {row['supplier'] for row in chunk if row.get('supplier')}, suppliers,
+            create_missing=self.create_missing_suppliers)
+        self._resolve_names(
+            'res.currency', {row['currency'] for row in chunk if row.get('currency')}, currencies)
+
+        selection = self.env['kedatech.material']._fields['material_type_kedatech'].selection
+        types = {label.lower(): value for value, label in selection}
+        types.update({value: value for value, label in selection})
+
+        vals_list = []
+        for index, row in enumerate(chunk, start=offset + 2):
+            material_type = types.get(str(row.get('type') or '').strip().lower())
+            if not material_type:
+                raise UserError(_('Row %s: unknown material type %r.') % (index, row.get('type')))
+            try:
+                price = float(row.get('price'))
+            except (TypeError, ValueError):
+                raise UserError(_('Row %s: price %r is not a number.') % (index, row.get('price')))
+            supplier_id = suppliers.get(row.get('supplier'))
+            if not supplier_id:
+                raise UserError(_('Row %s: unknown supplier %r.') % (index, row.get('supplier')))
+            vals = {
+                'name': row.get('name'),
+                'material_type_kedatech': material_type,
+                'material_price_kedatech': price,
+                'supplier_id_kedatech': supplier_id,
+            }
+            if row.get('currency'):
+                if row['currency'] not in currencies:
+                    raise UserError(_('Row %s: unknown currency %r.') % (index, row['currency']))
+                vals['currency_id_kedatech'] = currencies[row['currency']]
+            vals_list.append(vals)
+        return vals_list
+
+    def _resolve_names(self, model, names, cache, create_missing=False):
+        missing = names - set(cache)
+        if not missing:
+            return
+        Model = self.env[model].sudo().with_context(active_test=False)
+        for record in Model.search_read([('name', 'in', list(missing))], ['name'], order='id'):
+            cache.setdefault(record['name'], record['id'])
+        missing -= set(cache)
+        if missing and create_missing:
+            created = Model.create([{'name': name} for name in sorted(missing)])
+            cache.update({partner.name: partner.id for partner in created})
+
+    def _iter_rows(self):
+        """Yield each data row of the file as a dict keyed like ``IMPORT_COLUMNS``.
+
+        The file is read lazily from the filestore, the workbook is never
+        loaded as a whole.
+        """
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'import_file'),
+        ], limit=1)
+        if attachment.store_fname:
+            stream = open(attachment._full_path(attachment.store_fname), 'rb')
+        else:
+            stream = io.BytesIO(base64.b64decode(attachment.datas or b''))
+
+        with stream:
+            if self.name.lower().endswith('.csv'):
+                reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+            elif self.name.lower().endswith('.xlsx'):
+                if openpyxl is None:
+                    raise UserError(_('Importing XLSX files requires the openpyxl library.'))
+                workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+                reader = workbook.active.iter_rows(values_only=True)
+            else:
+                raise UserError(_('Only .csv and .xlsx files can be imported.'))
+
+            header = next(reader, None) or []
+            columns = [IMPORT_COLUMNS.get(str(title).strip()) if title else None for title in header]
+            for values in reader:
+                if not any(values):
+                    continue
+                yield {key: value for key, value in zip(columns, values) if key}
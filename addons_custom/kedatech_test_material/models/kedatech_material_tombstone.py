@@ -0,0 +1,68 @@
+from odoo import models, fields, api # type: ignore
+import logging
+
+
+_logger = logging.getLogger(__name__)
+
+class KedatechMaterialTombstone(models.Model):
+    _name = 'kedatech.material.tombstone'
+    _description = 'Deleted Material'
+    _order = 'id'
+    _log_access = False
+
+    material_id = fields.Integer(string="Material ID", required=True, index=True)
+    material_code_kedatech = fields.Char(string="Material Code")
+    deleted_date = fields.Datetime(string="Deleted On", required=True, default=fields.Datetime.now, index=True)
+
+    def init(self):
+        # Commit-ordered cursor of /api/materials/changes, see kedatech.material
+        self.env.cr.execute("ALTER TABLE kedatech_material_tombstone ADD COLUMN IF NOT EXISTS sync_txid bigint")
+        self.env.cr.execute("UPDATE kedatech_material_tombstone SET sync_txid = 0 WHERE sync_txid IS NULL")
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS kedatech_material_tombstone_sync_txid_index
+            ON kedatech_material_tombstone (sync_txid, id)
+        """)
+
+    @api.model
+    def _record_unlink(self, materials):
+        """Insert one tombstone per material of ``materials`` with a single statement."""
+        if not materials:
+            return
+        materials.flush(['material_code_kedatech'])
+        self.env.cr.execute("""
+            INSERT INTO kedatech_material_tombstone (material_id, material_code_kedatech, deleted_date, sync_txid)
+            SELECT id, material_code_kedatech, now() at time zone 'UTC', txid_current()
+            FROM kedatech_material WHERE id IN %s
+        """, [tuple(materials.ids)])
+
+    @api.model
+    def _get_sync_horizon(self):
+        """Return the lowest txid still in flight for the current snapshot."""
+        self.env.cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_deleted_since(self, txid, last_id, limit):
+        """Return up to ``limit`` tombstones recorded after the cursor, in commit order.
+
+        Like materials, only deletions of transactions that ended before the
+        current snapshot are returned.
+        """
+        self.env.cr.execute("""
+            SELECT sync_txid, id, material_id, material_code_kedatech, deleted_date
+            FROM kedatech_material_tombstone
+            WHERE (sync_txid, id) > (%s, %s)
+              AND sync_txid < txid_snapshot_xmin(txid_current_snapshot())
+            ORDER BY sync_txid, id
+            LIMIT %s
+        """, [txid, last_id, limit])
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def _gc_tombstones(self, days=90):
+        """Drop tombstones older than ``days``; clients syncing less often must do a full reload."""
+        self.env.cr.execute(
+            "DELETE FROM kedatech_material_tombstone WHERE deleted_date < (now() at time zone 'UTC') - %s * interval '1 day'",
+            [days],
+        )
+        _logger.info("Removed %s material tombstone(s) older than %s days", self.env.cr.rowcount, days)
@@ -1,21 +1,32 @@
-from odoo import models, fields, api # type: ignore
-from odoo.exceptions import ValidationError
+from odoo import models, fields, api, tools, _ # type: ignore
+from odoo.exceptions import UserError, ValidationError
+from collections import defaultdict
 import logging
+import psycopg2
+
+from ..tools import log_utils, material_cache
 
 
 _logger = logging.getLogger(__name__)
 
+# Mapping selection values to abbreviations
+MATERIAL_TYPE_CODES = {
+    'fabric_type': 'FBC',
+    'jeans_type': 'JNS',
+    'cotton_type': 'CTN'
+}
+
 class KedatechMaterial(models.Model):
     _name = 'kedatech.material'
     _description = 'Material'
 
     name = fields.Char(string="Material Name", required=True)
-    material_code_kedatech = fields.Char(string="Material Code")
+    material_code_kedatech = fields.Char(string="Material Code", copy=False)
     material_type_kedatech = fields.Selection([
         ('fabric_type', 'Fabric'),
         ('jeans_type', 'Jeans'),
         ('cotton_type', 'Cotton')
-    ], string="Material Type", required=True)
+    ], string="Material Type", required=True, index=True)
     material_price_kedatech = fields.Float(string="Material Buy Price", required=True)
     currency_id_kedatech = fields.Many2one(
         'res.currency',
@@ -23,41 +34,354 @@ class KedatechMaterial(models.Model):
         default=lambda self: self.env.company.currency_id.id,
         required=True
     )
-    supplier_id_kedatech = fields.Many2one('res.partner', string="Related Supplier", required=True)
+    supplier_id_kedatech = fields.Many2one('res.partner', string="Related Supplier", required=True, index=True)
+    material_price_company = fields.Float(
+        string="Buy Price (Company Currency)", compute='_compute_material_price_company', store=True, index=True,
+        help="Buy price converted to the company currency at the latest rate, used to compare suppliers.")
+
+    _sql_constraints = [
+        ('material_code_kedatech_unique', 'unique(material_code_kedatech)', 'Material Code must be unique.'),
+    ]
+
+    def init(self):
+        material_cache.create_signal_table(self.env.cr)
+
+        # Id of the last transaction that inserted or updated each row, the
+        # commit-ordered cursor of /api/materials/changes. A trigger keeps it
+        # so that raw SQL updates are tracked as well; an explicit change of
+        # the column is left as is.
+        self.env.cr.execute("ALTER TABLE kedatech_material ADD COLUMN IF NOT EXISTS sync_txid bigint")
+        self.env.cr.execute("UPDATE kedatech_material SET sync_txid = txid_current() WHERE sync_txid IS NULL")
+        self.env.cr.execute("""
+            CREATE OR REPLACE FUNCTION kedatech_material_set_sync_txid() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    NEW.sync_txid := txid_current();
+                ELSIF NEW.sync_txid IS NOT DISTINCT FROM OLD.sync_txid THEN
+                    NEW.sync_txid := txid_current();
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        self.env.cr.execute("DROP TRIGGER IF EXISTS kedatech_material_sync_txid ON kedatech_material")
+        self.env.cr.execute("""
+            CREATE TRIGGER kedatech_material_sync_txid
+            BEFORE INSERT OR UPDATE ON kedatech_material
+            FOR EACH ROW EXECUTE PROCEDURE kedatech_material_set_sync_txid()
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS kedatech_material_sync_txid_index
+            ON kedatech_material (sync_txid, id)
+        """)
+
+        # Trigram indexes backing ILIKE and similarity searches on the name
+        # and the code; they need the pg_trgm extension
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except psycopg2.Error:
+            _logger.warning("pg_trgm extension is not available, skipping trigram indexes on kedatech_material")
+            return
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS kedatech_material_name_trgm_index
+            ON kedatech_material USING gin (name gin_trgm_ops)
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS kedatech_material_code_trgm_index
+            ON kedatech_material USING gin (material_code_kedatech gin_trgm_ops)
+        """)
+        self.clear_caches()
+
+    @api.model
+    def _gc_cache_signals(self):
+        material_cache.gc_signals(self.env.cr)
+
+    @api.model
+    def _get_changed_since(self, txid, last_id, limit):
+        """Return the ``(sync_txid, id)`` of up to ``limit`` materials written after the cursor.
+
+        Rows are ordered by the transaction that last wrote them, and only the
+        transactions that ended before the current snapshot was taken are
+        returned: one still in flight commits with a txid above the cursor, so
+        its rows cannot be skipped. A long transaction holds back every row
+        written after it started until it ends.
+        """
+        self.flush()
+        self.env.cr.execute("""
+            SELECT sync_txid, id FROM kedatech_material
+            WHERE (sync_txid, id) > (%s, %s)
+              AND sync_txid < txid_snapshot_xmin(txid_current_snapshot())
+            ORDER BY sync_txid, id
+            LIMIT %s
+        """, [txid, last_id, limit])
+        return self.env.cr.fetchall()
+
+    @api.model
+    @tools.ormcache()
+    def _has_trigram_search(self):
+        self.env.cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _search_similar(self, query, limit):
+        """Return ``[(id, score)]`` of the materials whose name or code best match ``query``.
+
+        With pg_trgm, rows are matched by substring or word similarity through
+        the trigram indexes and ranked by the best word similarity of the name
+        and the code. Without it, a plain ILIKE on both is used and every match
+        scores ``None``.
+        """
+        query = query.strip()
+        if not self._has_trigram_search():
+            records = self.search([
+                '|', ('name', 'ilike', query), ('material_code_kedatech', 'ilike', query),
+            ], limit=limit, order='id')
+            return [(record_id, None) for record_id in records.ids]
+
+        self.flush(['name', 'material_code_kedatech'])
+        self.env.cr.execute("""
+            SELECT id, greatest(
+                       word_similarity(%(query)s, name),
+                       word_similarity(%(query)s, coalesce(material_code_kedatech, ''))
+                   ) AS score
+            FROM kedatech_material
+            WHERE name ILIKE %(pattern)s
+               OR material_code_kedatech ILIKE %(pattern)s
+               OR %(query)s <%% name
+               OR %(query)s <%% material_code_kedatech
+            ORDER BY score DESC, id
+            LIMIT %(limit)s
+        """, {'query': query, 'pattern': f"%{tools.escape_psql(query)}%", 'limit': limit})
+        return [(record_id, round(score, 4)) for record_id, score in self.env.cr.fetchall()]
 
     @api.constrains('material_price_kedatech')
     def _check_material_price(self):
         for record in self:
             if record.material_price_kedatech < 100:
-                _logger.error(f"Validation error: material price {record.material_price_kedatech} is less than 100.")
+                log_utils.log_throttled(
+                    _logger, logging.ERROR, 'price_check',
+                    "Validation error: material price %s is less than 100.", record.material_price_kedatech)
                 raise ValidationError('Material Buy Price must be at least 100.')
 
-    @api.model
-    def create(self, vals):
-        _logger.info(f"Creating KedatechMaterial with values: {vals}")
-        record = super(KedatechMaterial, self).create(vals)
+    @api.depends('material_price_kedatech', 'currency_id_kedatech')
+    def _compute_material_price_company(self):
+        company = self.env.company
+        ratios = self._get_conversion_ratios(
+            self.currency_id_kedatech.ids, company.currency_id, company, fields.Date.today())
+        for record in self:
+            ratio = ratios.get(record.currency_id_kedatech.id, 1.0)
+            record.material_price_company = company.currency_id.round(record.material_price_kedatech * ratio)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        log_utils.log_throttled(_logger, logging.INFO, 'create', "Creating %s KedatechMaterial record(s)", len(vals_list))
+        vals_list = self._prepare_material_codes([dict(vals) for vals in vals_list])
+        records = super(KedatechMaterial, self).create(vals_list)
+        material_cache.invalidate(self.env, records.ids)
+        return records
 
-        material_type = vals.get('material_type_kedatech')
-        material_name = vals.get('name')
+    def write(self, vals):
+        regenerate = 'material_code_kedatech' not in vals and ('name' in vals or 'material_type_kedatech' in vals)
+        previous_types = {record.id: record.material_type_kedatech for record in self} if regenerate else {}
+        res = super(KedatechMaterial, self).write(vals)
+        if regenerate:
+            self._regenerate_material_codes(previous_types)
+        material_cache.invalidate(self.env, self.ids)
+        return res
 
-        # Mapping selection values to abbreviations
-        type_mapping = {
-            'fabric_type': 'FBC',
-            'jeans_type': 'JNS',
-            'cotton_type': 'CTN'
-        }
+    def unlink(self):
+        material_cache.invalidate(self.env, self.ids)
+        self.env['kedatech.material.tombstone'].sudo()._record_unlink(self)
+        return super(KedatechMaterial, self).unlink()
 
+    @api.model
+    def _generate_material_code(self, material_type, material_name, number):
         if material_type and material_name:
-            type_code = type_mapping.get(material_type, 'UNK')
+            type_code = MATERIAL_TYPE_CODES.get(material_type, 'UNK')
             name_code = ''.join(word[0] for word in material_name.split()).upper()
-            record_id = str(record.id).zfill(3)
+            return f"{type_code}-{name_code}-{str(number).zfill(3)}"
+        material_code = f"UNK-UNK-{str(number).zfill(3)}"
+        log_utils.log_throttled(
+            _logger, logging.WARNING, 'unknown_code', "Material type or name missing. Set material code as: %s", material_code)
+        return material_code
 
-            material_code = f"{type_code}-{name_code}-{record_id}"
-            _logger.info(f"Generated material code: {material_code}")
-            record.material_code_kedatech = material_code
-        else:
-            material_code = f"UNK-UNK-{str(record.id).zfill(3)}"
-            _logger.warning(f"Material type or name missing. Set material code as: {material_code}")
-            record.material_code_kedatech = material_code
+    @api.model
+    def _get_material_sequence(self, material_type):
+        """Return the ``ir.sequence`` numbering the codes of ``material_type``.
+
+        Each type has its own sequence; codes that cannot get a type prefix
+        (``UNK-UNK-...``) share the generic ``kedatech.material`` one.
+        """
+        sequence_code = f'kedatech.material.{material_type}' if material_type in MATERIAL_TYPE_CODES else 'kedatech.material'
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', sequence_code),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            raise UserError(_('No sequence found for material codes (%s).') % sequence_code)
+        return sequence
 
-        return record
\ No newline at end of file
+    @api.model
+    def _allocate_material_numbers(self, material_type, count):
+        """Reserve ``count`` numbers of the sequence of ``material_type``.
+
+        Standard sequences are backed by a PostgreSQL sequence, which is read
+        ``count`` times in one query and never locks: concurrent creators
+        get disjoint numbers without waiting on each other.
+
+        This is not gap-free. Numbers taken by a transaction that rolls back
+        are lost, and a batch created alongside another one may get
+        interleaved rather than consecutive numbers. Gap-free numbering needs
+        a lock on the sequence row held until commit, which would serialize
+        every material creation; set the sequence to "No gap" where codes
+        must be contiguous, its numbers then go through that lock.
+        """
+        sequence = self._get_material_sequence(material_type)
+        if sequence.implementation != 'standard' or sequence.use_date_range:
+            # No gap and date range sequences allocate through their row
+            return [sequence._next() for _i in range(count)]
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)", ['ir_sequence_%03d' % sequence.id, count])
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
+
+    @api.model
+    def _prepare_material_codes(self, vals_list):
+        """Fill ``material_code_kedatech`` in ``vals_list``, one sequence read per type."""
+        pending = defaultdict(list)
+        for vals in vals_list:
+            if not vals.get('material_code_kedatech'):
+                material_type = vals.get('material_type_kedatech') if vals.get('name') else False
+                pending[material_type].append(vals)
+        for material_type, group in pending.items():
+            numbers = self._allocate_material_numbers(material_type, len(group))
+            for vals, number in zip(group, numbers):
+                vals['material_code_kedatech'] = self._generate_material_code(
+                    vals.get('material_type_kedatech'), vals.get('name'), number)
+        return vals_list
+
+    def _regenerate_material_codes(self, previous_types):
+        """Rebuild the codes after a change of name or type.
+
+        A renamed material keeps its number and only gets new initials, a
+        material moved to another type gets a number of the new type.
+        """
+        numbers = {}
+        pending = defaultdict(list)
+        for record in self:
+            type_code = MATERIAL_TYPE_CODES.get(record.material_type_kedatech, 'UNK')
+            code = record.material_code_kedatech or ''
+            number = code.rsplit('-', 1)[-1]
+            if (previous_types.get(record.id) == record.material_type_kedatech
+                    and code.startswith(f'{type_code}-') and number.isdigit()):
+                numbers[record.id] = number
+            else:
+                pending[record.material_type_kedatech if record.name else False].append(record.id)
+        for material_type, ids in pending.items():
+            numbers.update(zip(ids, self._allocate_material_numbers(material_type, len(ids))))
+
+        codes = {}
+        for record in self:
+            code = self._generate_material_code(record.material_type_kedatech, record.name, numbers[record.id])
+            if code != record.material_code_kedatech:
+                codes[record.id] = code
+        self._write_material_codes(codes)
+
+    def _write_material_codes(self, codes):
+        """Set ``material_code_kedatech`` from an ``{id: code}`` dict with one UPDATE statement."""
+        if not codes:
+            return
+        self.flush(['material_code_kedatech'])
+        self.env.cr.execute(
+            "UPDATE kedatech_material AS m SET material_code_kedatech = c.code "
+            "FROM (VALUES %s) AS c(id, code) WHERE m.id = c.id" % ', '.join(['(%s, %s)'] * len(codes)),
+            [value for pair in codes.items() for value in pair],
+        )
+        self.invalidate_cache(['material_code_kedatech'], list(codes))
+        _logger.debug("Regenerated %s material code(s)", len(codes))
+
+    @api.model
+    def _sync_material_sequences(self):
+        """Move each code sequence past the highest number already in use.
+
+        Codes used to be numbered by record id; this keeps new numbers clear
+        of them after an upgrade and of codes imported with their number.
+        """
+        for material_type, type_code in list(MATERIAL_TYPE_CODES.items()) + [(False, 'UNK')]:
+            sequence = self._get_material_sequence(material_type)
+            self.env.cr.execute(r"""
+                SELECT max(substring(material_code_kedatech FROM '-(\d+)$')::bigint)
+                FROM kedatech_material
+                WHERE material_code_kedatech LIKE %s
+            """, [f'{type_code}-%'])
+            last_number = self.env.cr.fetchone()[0]
+            if last_number and sequence.number_next_actual <= last_number:
+                sequence.write({'number_next': last_number + 1})
+                _logger.info("Material code sequence %s moved to %s", sequence.code, last_number + 1)
+
+    @api.model
+    def _get_currency_rates(self, currency_ids, company, date):
+        """Return ``{currency_id: rate}`` at ``date``, going through the per-worker rate cache.
+
+        A transaction that changed rates neither reads nor fills the cache.
+        """
+        cr = self.env.cr
+        rates, missing = {}, []
+        for currency_id in set(currency_ids):
+            rate = material_cache.lookup(cr, material_cache.rate_cache, (cr.dbname, currency_id, company.id, date))
+            if rate is None:
+                missing.append(currency_id)
+            else:
+                rates[currency_id] = rate
+        if missing:
+            fetched = self.env['res.currency'].sudo().browse(missing)._get_rates(company, date)
+            for currency_id, rate in fetched.items():
+                material_cache.store(cr, material_cache.rate_cache, (cr.dbname, currency_id, company.id, date), rate)
+            rates.update(fetched)
+        return rates
+
+    @api.model
+    def _get_conversion_ratios(self, currency_ids, to_currency, company, date):
+        """Return ``{currency_id: ratio}`` so that ``amount * ratio`` is ``amount`` in ``to_currency``."""
+        rates = self._get_currency_rates(list(currency_ids) + [to_currency.id], company, date)
+        return {currency_id: rates[to_currency.id] / rates[currency_id] for currency_id in currency_ids}
+
+    @api.model
+    def _recompute_company_prices(self, currency_ids=None):
+        """Recompute ``material_price_company`` after a rate change with one UPDATE.
+
+        Only materials priced in ``currency_ids`` (all of them by default) are
+        considered and only those whose converted price moved are written;
+        their ``write_date`` is bumped so that caches and sync clients see the
+        change.
+        """
+        company = self.env.company
+        self.flush(['material_price_kedatech', 'currency_id_kedatech', 'material_price_company'])
+        # The rate cache may hold the rates being replaced
+        material_cache.invalidate_all(self.env)
+        if currency_ids is None:
+            self.env.cr.execute("SELECT DISTINCT currency_id_kedatech FROM kedatech_material")
+            currency_ids = [currency_id for currency_id, in self.env.cr.fetchall()]
+        if not currency_ids:
+            return
+        ratios = self._get_conversion_ratios(currency_ids, company.currency_id, company, fields.Date.today())
+        self.env.cr.execute("""
+            UPDATE kedatech_material AS m
+            SET material_price_company = c.price, write_date = now() at time zone 'UTC'
+            FROM (
+                SELECT m.id, round((m.material_price_kedatech * r.ratio)::numeric, %%s) AS price
+                FROM kedatech_material AS m
+                JOIN (VALUES %s) AS r(currency_id, ratio) ON r.currency_id = m.currency_id_kedatech
+            ) AS c
+            WHERE m.id = c.id AND m.material_price_company IS DISTINCT FROM c.price
+        """ % ', '.join(['(%s, %s::float8)'] * len(ratios)),
+            [company.currency_id.decimal_places] + [value for pair in ratios.items() for value in pair],
+        )
+        updated = self.env.cr.rowcount
+        self.invalidate_cache(['material_price_company', 'write_date'])
+        _logger.info("Recomputed the company currency price of %s material(s)", updated)
+
+    @api.model
+    def _cron_recompute_company_prices(self):
+        # Rates dated in the future become current without any write
+        self._recompute_company_prices()
@@ -0,0 +1,37 @@
+from odoo import models, api # type: ignore
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = 'res.currency.rate'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rates = super(ResCurrencyRate, self).create(vals_list)
+        rates._recompute_material_prices(rates.currency_id)
+        return rates
+
+    def write(self, vals):
+        currencies = self.currency_id
+        res = super(ResCurrencyRate, self).write(vals)
+        self._recompute_material_prices(currencies | self.currency_id)
+        return res
+
+    def unlink(self):
+        currencies = self.currency_id
+        res = super(ResCurrencyRate, self).unlink()
+        self.env['res.currency.rate']._recompute_material_prices(currencies)
+        return res
+
+    @api.model
+    def _recompute_material_prices(self, currencies):
+        """Refresh the company currency prices of the materials priced in ``currencies``.
+
+        A new rate of the company currency moves every conversion, so all
+        materials are then recomputed.
+        """
+        self.flush()
+        Material = self.env['kedatech.material'].sudo()
+        if self.env.company.currency_id in currencies:
+            Material._recompute_company_prices()
+        else:
+            Material._recompute_company_prices(currencies.ids)
@@ -1,2 +1,5 @@
 from . import test_material
-from . import test_controller
\ No newline at end of file
+from . import test_controller
+from . import test_material_import
+from . import test_log_analyzer
+from . import test_benchmark
\ No newline at end of file
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+from odoo import SUPERUSER_ID, api, sql_db
+from odoo.tests.common import HttpCase, tagged
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from ..models import kedatech_materials
+from ..tools import log_utils, material_cache
+
+_logger = logging.getLogger(__name__)
+
+# Benchmarks are excluded from the standard run, select them with
+# --test-tags kedatech_benchmark. Everything is tunable from the environment:
+#   KEDATECH_BENCHMARK_SIZES       table sizes to measure (default 10000,100000,1000000)
+#   KEDATECH_BENCHMARK_ITERATIONS  calls per measured path (default 50)
+#   KEDATECH_BENCHMARK_OUTPUT      where to write the JSON results
+#   KEDATECH_BENCHMARK_BASELINE    JSON results of a previous run to compare with
+#   KEDATECH_BENCHMARK_TOLERANCE   allowed regression in percent (default 20)
+#   KEDATECH_BENCHMARK_THREADS     parallel creators of the code allocation stress test (default 32)
+BENCHMARK_SIZES = [int(size) for size in os.environ.get('KEDATECH_BENCHMARK_SIZES', '10000,100000,1000000').split(',')]
+BENCHMARK_ITERATIONS = int(os.environ.get('KEDATECH_BENCHMARK_ITERATIONS', 50))
+BENCHMARK_OUTPUT = os.environ.get('KEDATECH_BENCHMARK_OUTPUT', 'kedatech_benchmark.json')
+BENCHMARK_BASELINE = os.environ.get('KEDATECH_BENCHMARK_BASELINE')
+BENCHMARK_TOLERANCE = float(os.environ.get('KEDATECH_BENCHMARK_TOLERANCE', 20))
+BENCHMARK_SUPPLIERS = 500
+BENCHMARK_THREADS = int(os.environ.get('KEDATECH_BENCHMARK_THREADS', 32))
+STRESS_BATCHES = 20
+STRESS_BATCH_SIZE = 50
+# Absolute slack so that sub-millisecond paths do not fail on timer noise
+BENCHMARK_MIN_DELTA_MS = 1.0
+
+SERVER_TIMING_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def seed_materials(env, count, supplier_ids):
+    """Insert ``count`` materials with one INSERT ... SELECT generate_series.
+
+    Types are skewed (1% cotton) so that the type index has a selective value
+    to be measured against, suppliers are spread evenly over ``supplier_ids``.
+    """
+    env.cr.execute("SELECT coalesce(max(id), 0) FROM kedatech_material")
+    offset = env.cr.fetchone()[0]
+    env.cr.execute("""
+        INSERT INTO kedatech_material (
+            name, material_code_kedatech, material_type_kedatech, material_price_kedatech,
+            material_price_company, currency_id_kedatech, supplier_id_kedatech, create_uid, write_uid, create_date, write_date
+        )
+        SELECT 'Seed Material ' || i,
+               'SEED-' || i,
+               CASE WHEN i %% 100 = 0 THEN 'cotton_type'
+                    WHEN i %% 2 = 0 THEN 'jeans_type'
+                    ELSE 'fabric_type' END,
+               100 + (i %% 900),
+               100 + (i %% 900),
+               %s,
+               (%s::int[])[1 + i %% %s],
+               %s, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+        FROM generate_series(%s, %s) AS i
+    """, [env.company.currency_id.id, list(supplier_ids), len(supplier_ids), env.uid, env.uid,
+          offset + 1, offset + count])
+    env.cr.execute("ANALYZE kedatech_material")
+    env['kedatech.material'].invalidate_cache()
+
+
+def summarize(durations, queries, elapsed):
+    """Throughput, latency percentiles (ms) and median query count of a measured path."""
+    durations = sorted(durations)
+
+    def percentile(q):
+        return round(durations[max(0, -(-len(durations) * q // 100) - 1)] * 1000, 3)
+
+    return {
+        'iterations': len(durations),
+        'throughput_per_s': round(len(durations) / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'queries': sorted(queries)[len(queries) // 2],
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a message per path whose p95 latency or query count regressed."""
+    regressions = []
+    for size, paths in results.items():
+        for path, current in paths.items():
+            previous = baseline.get(size, {}).get(path)
+            if not previous:
+                continue
+            for metric, slack in (('p95_ms', BENCHMARK_MIN_DELTA_MS), ('queries', 0)):
+                limit = previous[metric] * (1 + tolerance / 100.0) + slack
+                if current[metric] > limit:
+                    regressions.append(
+                        f"{size} rows, {path}: {metric} {current[metric]} > {previous[metric]} (+{tolerance}%)")
+    return regressions
+
+
+@tagged('kedatech_benchmark', '-standard', 'post_install', '-at_install')
+class TestKedatechMaterialBenchmark(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate('admin', 'admin')
+        self.suppliers = self.env['res.partner'].create([
+            {'name': f'Benchmark Supplier {i}'} for i in range(BENCHMARK_SUPPLIERS)
+        ])
+        self.material_vals = {
+            'name': 'Benchmark Material',
+            'material_type_kedatech': 'fabric_type',
+            'material_price_kedatech': 150.0,
+            'supplier_id_kedatech': self.suppliers[0].id,
+        }
+
+    def _explain(self, query, params):
+        self.env.cr.execute("EXPLAIN " + query, params)
+        plan = '\n'.join(row[0] for row in self.env.cr.fetchall())
+        _logger.info("Plan for %s:\n%s", query, plan)
+        return plan
+
+    def _measure_orm(self, func, per_call=1):
+        """Run ``func(i)`` and report latency and queries per record."""
+        durations, queries = [], []
+        start = time.perf_counter()
+        for i in range(BENCHMARK_ITERATIONS):
+            count = self.env.cr.sql_log_count
+            t0 = time.perf_counter()
+            func(i)
+            self.env['kedatech.material'].flush()
+            durations.append((time.perf_counter() - t0) / per_call)
+            queries.append((self.env.cr.sql_log_count - count) / per_call)
+        return summarize(durations, queries, (time.perf_counter() - start) / per_call)
+
+    def _measure_route(self, url_for, method='GET', data_for=None):
+        """Call a route and report latency and the query count from its Server-Timing header."""
+        durations, queries = [], []
+        start = time.perf_counter()
+        for i in range(BENCHMARK_ITERATIONS):
+            t0 = time.perf_counter()
+            if method == 'GET':
+                response = self.url_open(url_for(i))
+            else:
+                response = self.url_open(url_for(i), data=json.dumps(data_for(i)),
+                                         headers={'Content-Type': 'application/json'})
+            durations.append(time.perf_counter() - t0)
+            self.assertLess(response.status_code, 400, response.text)
+            match = SERVER_TIMING_QUERIES_RE.search(response.headers.get('Server-Timing', ''))
+            queries.append(int(match.group(1)) if match else 0)
+        return summarize(durations, queries, time.perf_counter() - start)
+
+    def _measure_size(self):
+        Material = self.env['kedatech.material']
+        self.env.cr.execute("SELECT min(id), max(id) FROM kedatech_material")
+        min_id, max_id = self.env.cr.fetchone()
+        middle_id = (min_id + max_id) // 2
+        step = max(1, (max_id - min_id) // BENCHMARK_ITERATIONS)
+        material_cache.payload_cache.clear()
+
+        def create_batch(i):
+            Material.create([dict(self.material_vals, name=f'Batch {i} {n}') for n in range(100)])
+
+        return {
+            'route:list_materials': self._measure_route(
+                lambda i: f'/api/materials?limit=100&after_id={middle_id + i * 100}'),
+            'route:list_materials_by_type': self._measure_route(
+                lambda i: f'/api/materials?type=cotton_type&limit=100&after_id={middle_id}'),
+            'route:list_materials_by_price': self._measure_route(
+                lambda i: f'/api/materials?sort=-company_price&min_price={100 + i * 10}&limit=100'),
+            'route:get_material_miss': self._measure_route(
+                lambda i: f'/api/materials/{min_id + i * step}'),
+            'route:get_material_hit': self._measure_route(
+                lambda i: f'/api/materials/{middle_id}'),
+            'route:search_materials': self._measure_route(
+                lambda i: f'/api/materials/search?q=Material {middle_id + i * step}'),
+            'route:create_material': self._measure_route(
+                lambda i: '/api/materials', method='POST',
+                data_for=lambda i: {'name': f'Route Material {i}', 'type': 'jeans_type', 'price': 200,
+                                    'supplier_id': self.suppliers[0].id}),
+            'route:batch_get_100': self._measure_route(
+                lambda i: '/api/materials/batch', method='POST',
+                data_for=lambda i: [{'method': 'GET', 'id': min_id + i * step + n} for n in range(100)]),
+            'orm:create': self._measure_orm(
+                lambda i: Material.create(dict(self.material_vals, name=f'Single {i}'))),
+            'orm:create_batch_100': self._measure_orm(create_batch, per_call=100),
+            'orm:write': self._measure_orm(
+                lambda i: Material.browse(min_id + i * step).write({'material_price_kedatech': 200 + i})),
+            'orm:rename_100': self._measure_orm(
+                lambda i: Material.browse(range(middle_id + i * 100, middle_id + (i + 1) * 100)).write(
+                    {'name': f'Renamed Material {i}'}),
+                per_call=100),
+        }
+
+    def test_lookup_paths_use_indexes(self):
+        """Test the common lookup paths are served by index scans"""
+        seed_materials(self.env, max(BENCHMARK_SIZES), self.suppliers.ids)
+        lookups = [
+            ("SELECT id FROM kedatech_material WHERE material_code_kedatech = %s", ['SEED-4242']),
+            ("SELECT id FROM kedatech_material WHERE supplier_id_kedatech = %s", [self.suppliers[7].id]),
+            ("SELECT id FROM kedatech_material WHERE material_type_kedatech = %s", ['cotton_type']),
+            ("SELECT id FROM kedatech_material WHERE material_type_kedatech = %s AND id > %s ORDER BY id LIMIT 100",
+             ['jeans_type', 0]),
+        ]
+        if self.env['kedatech.material']._has_trigram_search():
+            lookups += [
+                ("SELECT id FROM kedatech_material WHERE name ILIKE %s", ['%Material 4242%']),
+                ("SELECT id FROM kedatech_material WHERE %s <%% material_code_kedatech", ['SEED-424']),
+            ]
+
+        for query, params in lookups:
+            with self.subTest(query=query):
+                self.assertIn('Index', self._explain(query, params))
+
+    def test_scaling_benchmark(self):
+        """Measure routes and ORM paths at growing table sizes against the baseline"""
+        results = {}
+        seeded = 0
+        for size in sorted(BENCHMARK_SIZES):
+            _logger.info("Seeding materials up to %s rows...", size)
+            seed_materials(self.env, size - seeded, self.suppliers.ids)
+            seeded = size
+            results[str(size)] = self._measure_size()
+            _logger.info("Benchmark results for %s rows: %s", size, json.dumps(results[str(size)], indent=2))
+
+        with open(BENCHMARK_OUTPUT, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        _logger.info("Benchmark results written to %s", BENCHMARK_OUTPUT)
+
+        if BENCHMARK_BASELINE:
+            with open(BENCHMARK_BASELINE) as baseline:
+                regressions = compare_with_baseline(results, json.load(baseline), BENCHMARK_TOLERANCE)
+            self.assertFalse(regressions, "Performance regressions:\n" + '\n'.join(regressions))
+
+    def test_logging_overhead(self):
+        """Measure the per-create cost of logging: unthrottled, throttled and queued"""
+        Material = self.env['kedatech.material']
+        model_logger = logging.getLogger(kedatech_materials.__name__)
+        saved = model_logger.level, model_logger.propagate, model_logger.handlers[:]
+        setups = [
+            # Every create logged synchronously, as before throttling
+            ('unthrottled_sync', 10 ** 9, False),
+            ('throttled_sync', log_utils.THROTTLE_BURST, False),
+            ('throttled_async', log_utils.THROTTLE_BURST, True),
+        ]
+        results = {}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                for setup, burst, queued in setups:
+                    handler = logging.FileHandler(os.path.join(tmpdir, f'{setup}.log'))
+                    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+                    model_logger.handlers = [handler]
+                    model_logger.propagate = False
+                    model_logger.setLevel(logging.DEBUG)
+                    log_utils._throttle.clear()
+                    if queued:
+                        log_utils.install_async_handlers(model_logger)
+                    with patch.object(log_utils, 'THROTTLE_BURST', burst):
+                        results[setup] = self._measure_orm(
+                            lambda i: Material.create(dict(self.material_vals, name=f'Logged {setup} {i}')))
+                    log_utils.uninstall_async_handlers(model_logger)
+                    handler.close()
+            finally:
+                model_logger.level, model_logger.propagate, model_logger.handlers = saved
+        _logger.info("Logging cost per create: %s", json.dumps(results, indent=2))
+
+    def test_concurrent_code_allocation(self):
+        """Create materials from parallel committed transactions and check codes stay unique"""
+        # The test cursor serializes everything, the creators need their own connections
+        db = sql_db.db_connect(self.env.cr.dbname)
+        with db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            supplier_id = env['res.partner'].create({'name': 'Stress Supplier'}).id
+        material_types = ['fabric_type', 'jeans_type', 'cotton_type']
+        barrier = threading.Barrier(BENCHMARK_THREADS)
+        created, errors = [], []
+
+        def creator(worker):
+            try:
+                with api.Environment.manage(), db.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    barrier.wait()
+                    for batch in range(STRESS_BATCHES):
+                        records = env['kedatech.material'].create([{
+                            'name': f'Stress Material {worker} {batch} {n}',
+                            'material_type_kedatech': material_types[(worker + n) % len(material_types)],
+                            'material_price_kedatech': 150.0,
+                            'supplier_id_kedatech': supplier_id,
+                        } for n in range(STRESS_BATCH_SIZE)])
+                        cr.commit()
+                        created.extend(records.ids)
+            except Exception as e:
+                errors.append(f"worker {worker}: {e}")
+
+        threads = [threading.Thread(target=creator, args=(worker,)) for worker in range(BENCHMARK_THREADS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            self.assertFalse(errors, '\n'.join(errors))
+            self.assertEqual(len(created), BENCHMARK_THREADS * STRESS_BATCHES * STRESS_BATCH_SIZE)
+            with db.cursor() as cr:
+                cr.execute("""
+                    SELECT count(*), count(DISTINCT material_code_kedatech)
+                    FROM kedatech_material WHERE id IN %s
+                """, [tuple(created)])
+                total, distinct = cr.fetchone()
+            self.assertEqual(total, len(created))
+            self.assertEqual(distinct, total, "Parallel creators produced duplicate codes")
+            _logger.info("%s materials created by %s parallel creators in %.2fs (%.0f/s)",
+                         total, BENCHMARK_THREADS, elapsed, total / elapsed)
+        finally:
+            with db.cursor() as cr:
+                if created:
+                    cr.execute("DELETE FROM kedatech_material WHERE id IN %s", [tuple(created)])
+                cr.execute("DELETE FROM res_partner WHERE id = %s", [supplier_id])
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 from http import HTTPStatus
+from odoo import fields
 from odoo.tests.common import HttpCase, tagged
 import json
 import logging
+import re
 import requests
 
+from ..controllers.kedatech_controllers import _decode_sync_token, _encode_sync_token
+from ..tools import material_cache
+
 _logger = logging.getLogger(__name__)
 
 @tagged('post_install', '-at_install')
@@ -69,3 +74,442 @@ class TestKedatechMaterialController(HttpCase):
         confirm_delete = self.url_open(f'/api/materials/{material_id}')
         self.assertEqual(confirm_delete.status_code, HTTPStatus.NOT_FOUND)
 
+
+    def test_list_materials_pagination(self):
+        materials = self.env['kedatech.material'].create([{
+            'name': f'Paged Material {i}',
+            'material_type_kedatech': 'cotton_type',
+            'material_price_kedatech': 150,
+            'supplier_id_kedatech': self.supplier.id,
+        } for i in range(3)])
+        after_id = materials[0].id - 1
+
+        # 1. First page follows the id order and returns a cursor
+        response = self.url_open(f'/api/materials?type=cotton_type&limit=2&after_id={after_id}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        page = json.loads(response.text)
+        self.assertEqual([m['id'] for m in page['data']], materials[:2].ids)
+        self.assertEqual(page['data'][0]['supplier'], 'Test Supplier')
+        self.assertEqual(page['next_cursor'], materials[1].id)
+
+        # 2. Last page has no cursor
+        response = self.url_open(f"/api/materials?type=cotton_type&limit=2&after_id={page['next_cursor']}")
+        page = json.loads(response.text)
+        self.assertEqual([m['id'] for m in page['data']], materials[2:].ids)
+        self.assertIsNone(page['next_cursor'])
+
+        # 3. Sparse fields
+        response = self.url_open(f'/api/materials?fields=code,name&limit=1&after_id={after_id}')
+        row = json.loads(response.text)['data'][0]
+        self.assertEqual(set(row), {'code', 'name'})
+        response = self.url_open(f'/api/materials?fields=id&limit=1&after_id={after_id}')
+        self.assertEqual(json.loads(response.text)['data'], [{'id': materials[0].id}])
+
+        # 4. Lookup by material code
+        response = self.url_open(f'/api/materials?code={materials[2].material_code_kedatech}')
+        self.assertEqual([m['id'] for m in json.loads(response.text)['data']], materials[2].ids)
+
+        # 5. Invalid parameters
+        self.assertEqual(self.url_open('/api/materials?fields=bogus').status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.url_open('/api/materials?limit=0').status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_export_materials(self):
+        material = self.env['kedatech.material'].create({
+            'name': 'Exported Material',
+            'material_type_kedatech': 'jeans_type',
+            'material_price_kedatech': 300,
+            'supplier_id_kedatech': self.supplier.id,
+        })
+
+        # 1. NDJSON, one object per line
+        response = self.url_open('/api/materials/export?format=ndjson&type=jeans_type')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertIn(material.id, [row['id'] for row in rows])
+
+        # 2. CSV with a header row
+        response = self.url_open('/api/materials/export?format=csv&fields=id,name&type=jeans_type')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0], 'id,name')
+        self.assertIn(f'{material.id},Exported Material', lines)
+
+        # 3. Unknown format
+        response = self.url_open('/api/materials/export?format=xml')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_bulk_create_materials(self):
+        payload = [{
+            'name': f'Bulk Material {i}',
+            'type': 'fabric_type',
+            'price': 150 + i,
+            'supplier_id': self.supplier.id,
+        } for i in range(3)]
+        response = self.url_open(
+            '/api/materials/bulk',
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        result = json.loads(response.text)
+        self.assertEqual(result['count'], 3)
+
+        materials = self.env['kedatech.material'].browse(result['material_ids'])
+        self.assertEqual(materials.mapped('name'), [item['name'] for item in payload])
+        self.assertTrue(all(code.startswith('FBC-BM') for code in materials.mapped('material_code_kedatech')))
+
+        # One invalid item rejects the whole batch
+        payload.append({'name': 'No Price', 'type': 'fabric_type'})
+        response = self.url_open(
+            '/api/materials/bulk',
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('Item 3', json.loads(response.text)['error'])
+
+        # A price rejected by the model constraint creates none of the rows
+        Material = self.env['kedatech.material']
+        payload[3] = {'name': 'Cheap Material', 'type': 'fabric_type', 'price': 50, 'supplier_id': self.supplier.id}
+        count = Material.search_count([])
+        response = self.url_open(
+            '/api/materials/bulk',
+            data=json.dumps(payload),
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertNotEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertFalse(json.loads(response.text)['success'])
+        self.assertEqual(Material.search_count([]), count)
+
+    def test_get_material_cache(self):
+        material = self.env['kedatech.material'].create({
+            'name': 'Cached Material',
+            'material_type_kedatech': 'fabric_type',
+            'material_price_kedatech': 200,
+            'supplier_id_kedatech': self.supplier.id,
+        })
+        stats_before = json.loads(self.url_open('/api/materials/_cache').text)['data']['payload']
+
+        # 1. Second read is served from the cache
+        self.url_open(f'/api/materials/{material.id}')
+        response = self.url_open(f'/api/materials/{material.id}')
+        self.assertEqual(json.loads(response.text)['data']['price'], 200)
+        stats_after = json.loads(self.url_open('/api/materials/_cache').text)['data']['payload']
+        self.assertGreater(stats_after['hits'], stats_before['hits'])
+
+        # 2. A write invalidates the cached payload
+        material.write({'material_price_kedatech': 300})
+        response = self.url_open(f'/api/materials/{material.id}')
+        self.assertEqual(json.loads(response.text)['data']['price'], 300)
+
+        # 3. What a writing transaction reads is not cached, it may still be rolled back
+        material_cache.payload_cache.clear()
+        response = self.url_open('/api/materials/batch', data=json.dumps([
+            {'method': 'PUT', 'id': material.id, 'body': {'price': 400}},
+            {'method': 'GET', 'id': material.id},
+        ]), headers={'Content-Type': 'application/json'})
+        self.assertEqual(json.loads(response.text)['results'][1]['body']['data']['price'], 400)
+        self.assertEqual(material_cache.payload_cache.stats()['size'], 0)
+
+    def test_conditional_get(self):
+        material = self.env['kedatech.material'].create({
+            'name': 'Conditional Material',
+            'material_type_kedatech': 'fabric_type',
+            'material_price_kedatech': 200,
+            'supplier_id_kedatech': self.supplier.id,
+        })
+
+        for url in [f'/api/materials/{material.id}', '/api/materials?type=fabric_type']:
+            with self.subTest(url=url):
+                response = self.url_open(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                etag = response.headers['ETag']
+                self.assertTrue(response.headers.get('Last-Modified'))
+
+                # 1. Unchanged resource, validated with one aggregate query and
+                # without loading the record, even when it is not cached
+                material_cache.payload_cache.clear()
+                response = self.url_open(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertFalse(response.content)
+                queries = int(re.search(r'desc="(\d+) queries"', response.headers['Server-Timing']).group(1))
+                self.assertLessEqual(queries, 2)
+
+                # 2. Stale validator
+                response = self.url_open(url, headers={'If-None-Match': 'W/"stale"'})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_material_changes(self):
+        Material = self.env['kedatech.material']
+        response = self.url_open('/api/materials/changes?limit=1000')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        token = json.loads(response.text)['next_token']
+
+        materials = Material.create([{
+            'name': f'Synced Material {i}',
+            'material_type_kedatech': 'jeans_type',
+            'material_price_kedatech': 200,
+            'supplier_id_kedatech': self.supplier.id,
+        } for i in range(2)])
+
+        # 1. Rows of a transaction still in flight, this one, are held back
+        result = json.loads(self.url_open(f'/api/materials/changes?since={token}').text)
+        self.assertFalse(result['changes'])
+        self.assertEqual(result['next_token'], token)
+
+        # Mark the rows as written by a transaction that already ended
+        self.env.cr.execute("""
+            UPDATE kedatech_material SET sync_txid = txid_snapshot_xmin(txid_current_snapshot()) - 1
+            WHERE id IN %s
+        """, [tuple(materials.ids)])
+
+        # 2. Created rows are returned after the token
+        result = json.loads(self.url_open(f'/api/materials/changes?since={token}').text)
+        self.assertEqual([m['id'] for m in result['changes']], materials.ids)
+        self.assertFalse(result['deleted'])
+        token = result['next_token']
+
+        # 3. Nothing new since the last token
+        result = json.loads(self.url_open(f'/api/materials/changes?since={token}').text)
+        self.assertFalse(result['changes'])
+
+        # 4. Deletions come back as tombstones. The initial token starts at
+        # the transactions in flight, this one included, so rewind its
+        # tombstone cursor below the aged deletion.
+        deleted_id = materials[0].id
+        materials[0].unlink()
+        self.env.cr.execute(
+            "UPDATE kedatech_material_tombstone SET sync_txid = 1 WHERE material_id = %s", [deleted_id])
+        material_cursor, _tombstone_cursor = _decode_sync_token(token)
+        token = _encode_sync_token(material_cursor, (0, 0))
+        result = json.loads(self.url_open(f'/api/materials/changes?since={token}').text)
+        self.assertIn(deleted_id, [d['id'] for d in result['deleted']])
+        self.assertFalse(result['changes'])
+
+        # 5. Invalid token
+        response = self.url_open('/api/materials/changes?since=garbage')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_bulk_update_and_delete(self):
+        materials = self.env['kedatech.material'].create([{
+            'name': f'Repriced Material {i}',
+            'material_type_kedatech': 'fabric_type',
+            'material_price_kedatech': 150,
+            'supplier_id_kedatech': self.supplier.id,
+        } for i in range(3)])
+        missing_id = materials[-1].id + 1000
+
+        # 1. Bulk update with per-id results
+        response = self.opener.patch(
+            f'{self.base_url()}/api/materials/bulk',
+            data=json.dumps([
+                {'id': materials[0].id, 'price': 400},
+                {'id': materials[1].id, 'price': 400},
+                {'id': materials[2].id, 'price': 50},
+                {'id': missing_id, 'price': 400},
+            ]),
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        result = json.loads(response.text)
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual([r['success'] for r in result['results']], [True, True, False, False])
+        materials.invalidate_cache()
+        self.assertEqual(materials.mapped('material_price_kedatech'), [400, 400, 150])
+
+        # 2. Bulk delete with per-id results
+        response = self.opener.delete(
+            f'{self.base_url()}/api/materials/bulk',
+            data=json.dumps(materials[:2].ids + [missing_id]),
+            headers={'Content-Type': 'application/json'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        result = json.loads(response.text)
+        self.assertEqual(result['deleted'], 2)
+        self.assertEqual([r['success'] for r in result['results']], [True, True, False])
+        self.assertEqual(materials.exists(), materials[2])
+
+    def test_material_stats(self):
+        supplier = self.env['res.partner'].create({'name': 'Stats Supplier'})
+        self.env['kedatech.material'].create([{
+            'name': f'Stats Material {price}',
+            'material_type_kedatech': 'cotton_type',
+            'material_price_kedatech': price,
+            'supplier_id_kedatech': supplier.id,
+        } for price in (100, 200, 300)])
+
+        response = self.url_open('/api/materials/stats?group_by=type,supplier&type=cotton_type')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        groups = json.loads(response.text)['data']
+        group = next(g for g in groups if g['supplier'] and g['supplier']['id'] == supplier.id)
+        self.assertEqual(group['type'], 'cotton_type')
+        self.assertEqual(group['count'], 3)
+        self.assertEqual((group['min_price'], group['avg_price'], group['max_price']), (100, 200, 300))
+
+        # A new material invalidates the cached aggregates
+        self.env['kedatech.material'].create({
+            'name': 'Stats Material 400',
+            'material_type_kedatech': 'cotton_type',
+            'material_price_kedatech': 400,
+            'supplier_id_kedatech': supplier.id,
+        })
+        groups = json.loads(self.url_open('/api/materials/stats?group_by=type,supplier&type=cotton_type').text)['data']
+        group = next(g for g in groups if g['supplier'] and g['supplier']['id'] == supplier.id)
+        self.assertEqual(group['count'], 4)
+
+        response = self.url_open('/api/materials/stats?group_by=colour')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_route_metrics(self):
+        response = self.url_open('/api/materials?limit=5')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('sql;dur=', response.headers['Server-Timing'])
+
+        metrics = json.loads(self.url_open('/api/materials/_metrics').text)['data']
+        list_metrics = metrics['list_materials']
+        self.assertGreaterEqual(list_metrics['count'], 1)
+        self.assertEqual(set(list_metrics['total_ms']), {'p50', 'p95', 'p99'})
+        self.assertGreater(list_metrics['payload_bytes']['p50'], 0)
+
+    def test_response_compression(self):
+        self.env['kedatech.material'].create([{
+            'name': f'Compressed Material {i}',
+            'material_type_kedatech': 'jeans_type',
+            'material_price_kedatech': 150,
+            'supplier_id_kedatech': self.supplier.id,
+        } for i in range(50)])
+
+        response = self.url_open('/api/materials?limit=50', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        # requests decodes the body transparently, it is compact JSON
+        self.assertEqual(len(json.loads(response.text)['data']), 50)
+        self.assertNotIn('", "', response.text)
+
+        response = self.url_open('/api/materials?limit=50', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        # Small bodies are not worth compressing
+        response = self.url_open('/api/materials?limit=1', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        response = self.url_open('/api/materials/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Compressed Material 0', response.text)
+
+    def test_material_search(self):
+        materials = self.env['kedatech.material'].create([{
+            'name': name,
+            'material_type_kedatech': 'jeans_type',
+            'material_price_kedatech': 150,
+            'supplier_id_kedatech': self.supplier.id,
+        } for name in ('Stretch Denim Indigo', 'Raw Selvedge Denim', 'Linen Blend')])
+
+        response = self.url_open('/api/materials/search?q=selvedge')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        results = json.loads(response.text)['data']
+        self.assertEqual(results[0]['id'], materials[1].id)
+        self.assertNotIn(materials[2].id, [row['id'] for row in results])
+
+        # Code fragments match as well
+        code = materials[2].material_code_kedatech
+        results = json.loads(self.url_open(f'/api/materials/search?q={code}&fields=code').text)['data']
+        self.assertEqual(results[0]['code'], code)
+        self.assertIn('score', results[0])
+
+        # Repeated queries are answered from the cache until a material changes
+        self.url_open('/api/materials/search?q=selvedge')
+        stats = json.loads(self.url_open('/api/materials/_cache').text)['data']['search']
+        self.assertGreaterEqual(stats['hits'], 1)
+        materials[0].name = 'Selvedge Denim Indigo'
+        results = json.loads(self.url_open('/api/materials/search?q=selvedge').text)['data']
+        self.assertEqual({row['id'] for row in results} & set(materials.ids), set(materials[:2].ids))
+
+        self.assertEqual(self.url_open('/api/materials/search').status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.url_open('/api/materials/search?q=denim&limit=0').status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_material_prices_in_currency(self):
+        company = self.env.company
+        today = fields.Date.today()
+        other_currency = self.env['res.currency'].with_context(active_test=False).search([
+            ('id', '!=', company.currency_id.id)], limit=1)
+        self.env['res.currency.rate'].search([
+            ('currency_id', '=', other_currency.id), ('name', '=', today), ('company_id', '=', company.id)]).unlink()
+        self.env['res.currency.rate'].create({
+            'currency_id': other_currency.id, 'rate': 2.0, 'name': today, 'company_id': company.id})
+        materials = self.env['kedatech.material'].create([{
+            'name': f'Priced Material {price}',
+            'material_type_kedatech': 'cotton_type',
+            'material_price_kedatech': price,
+            'supplier_id_kedatech': self.supplier.id,
+        } for price in (200000, 100000, 300000)])
+
+        response = self.url_open(f'/api/materials/{materials[0].id}?currency={other_currency.name}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = json.loads(response.text)['data']
+        self.assertEqual(data['currency'], company.currency_id.name)
+        self.assertEqual(data['company_price'], 200000)
+        self.assertAlmostEqual(
+            data['converted_price'], company.currency_id._convert(200000, other_currency, company, today))
+
+        # Filtered and sorted by the company price in SQL, paginated on (price, id)
+        url = '/api/materials?type=cotton_type&min_price=150000&sort=-company_price&limit=1&fields=name'
+        result = json.loads(self.url_open(url).text)
+        self.assertEqual([row['name'] for row in result['data']], ['Priced Material 300000'])
+        self.assertEqual(result['next_price_cursor'], 300000)
+        result = json.loads(self.url_open(
+            f"{url}&after_id={result['next_cursor']}&after_price={result['next_price_cursor']}").text)
+        self.assertEqual([row['name'] for row in result['data']], ['Priced Material 200000'])
+
+        # Bounds given with a currency are in that currency
+        converted = company.currency_id._convert(100000, other_currency, company, today)
+        result = json.loads(self.url_open(
+            f'/api/materials?type=cotton_type&min_price={converted - 1}&max_price={converted + 1}'
+            f'&currency={other_currency.name}&fields=name').text)
+        self.assertEqual(result['currency'], other_currency.name)
+        self.assertEqual([row['name'] for row in result['data']], ['Priced Material 100000'])
+        self.assertAlmostEqual(result['data'][0]['converted_price'], converted)
+
+        response = self.url_open('/api/materials?currency=XXX')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.url_open('/api/materials?sort=name')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_material_batch(self):
+        materials = self.env['kedatech.material'].create([{
+            'name': f'Batch Material {i}',
+            'material_type_kedatech': 'fabric_type',
+            'material_price_kedatech': 150,
+            'supplier_id_kedatech': self.supplier.id,
+        } for i in range(3)])
+
+        response = self.url_open('/api/materials/batch', data=json.dumps({'operations': [
+            {'method': 'POST', 'body': {'name': 'Batch New', 'type': 'jeans_type', 'price': 300,
+                                        'supplier_id': self.supplier.id}},
+            {'method': 'PUT', 'id': materials[0].id, 'body': {'price': 250}},
+            {'method': 'GET', 'id': materials[0].id},
+            {'method': 'DELETE', 'id': materials[1].id},
+            {'method': 'GET', 'id': materials[1].id},
+            # Fails the price constraint, only this operation is rolled back
+            {'method': 'PUT', 'id': materials[2].id, 'body': {'name': 'Too Cheap', 'price': 50}},
+            {'method': 'PUT', 'id': materials[2].id, 'body': {'price': 'free'}},
+        ]}), headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        result = json.loads(response.text)
+        self.assertEqual([r['status'] for r in result['results']], [201, 200, 200, 200, 404, 500, 400])
+        self.assertEqual(result['failed'], 3)
+        self.assertEqual(result['results'][2]['body']['data']['price'], 250)
+
+        created = self.env['kedatech.material'].browse(result['results'][0]['body']['material_id'])
+        self.assertEqual(created.name, 'Batch New')
+        self.assertFalse(materials[1].exists())
+        self.assertEqual(materials[2].name, 'Batch Material 2')
+        self.assertEqual(materials[2].material_price_kedatech, 150)
+
+        response = self.url_open('/api/materials/batch', data=json.dumps([{'method': 'PATCH', 'id': 1}]),
+                                 headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.url_open('/api/materials/batch', data=json.dumps([{'method': 'GET'}]),
+                                 headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import BaseCase, tagged
+import logging
+
+from ..tools import log_analyzer
+
+_logger = logging.getLogger(__name__)
+
+LOG_LINES = [
+    '2025-05-27 19:48:56,019 18144 INFO db odoo.addons.kedatech_test_material.models.kedatech_materials: '
+    'Creating KedatechMaterial with values: {}',
+    '2025-05-27 20:36:07,072 21372 ERROR db odoo.addons.kedatech_test_material.models.kedatech_materials: '
+    'Validation error: material price 99.99 is less than 100.',
+    '2025-05-27 17:57:41,647 19744 INFO db werkzeug: 127.0.0.1 - - [27/May/2025 17:57:41] '
+    '"GET /api/materials/12 HTTP/1.1" 200 - 4 0.002 0.010',
+    '2025-05-27 17:57:41,660 19744 INFO db werkzeug: 127.0.0.1 - - [27/May/2025 17:57:41] '
+    '"GET /api/materials/13?fields=name HTTP/1.1" 200 - 6 0.004 0.020',
+    '2025-05-27 17:57:49,128 19744 INFO db werkzeug: 127.0.0.1 - - [27/May/2025 17:57:49] '
+    '"GET /api/materials HTTP/1.1" 200 - 812 1.057 2.101',
+    '2025-05-27 17:58:04,481 19744 INFO ? werkzeug: 127.0.0.1 - - [27/May/2025 17:58:04] '
+    '"GET /base/static/description/icon.png HTTP/1.1" 200 - - - -',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestLogAnalyzer(BaseCase):
+
+    def test_parse_line(self):
+        """Test werkzeug lines are parsed and their paths normalized"""
+        request = log_analyzer.parse_line(LOG_LINES[3])
+        self.assertEqual(request['route'], '/api/materials/<id>')
+        self.assertEqual(request['queries'], 6)
+        self.assertAlmostEqual(request['duration'], 0.024)
+
+        static = log_analyzer.parse_line(LOG_LINES[5])
+        self.assertIsNone(static['queries'])
+        self.assertIsNone(static['duration'])
+        self.assertIsNone(log_analyzer.parse_line(LOG_LINES[0]))
+
+    def test_report(self):
+        """Test requests are aggregated per endpoint with slow and N+1 flags"""
+        report = log_analyzer.LogAnalyzer(slow_ms=1000, n1_queries=100).feed(LOG_LINES).report()
+
+        self.assertEqual(report['requests'], 4)
+        self.assertEqual(report['material_events'], {'create': 1, 'errors': 1})
+        endpoints = {(e['method'], e['route']): e for e in report['endpoints']}
+        detail = endpoints[('GET', '/api/materials/<id>')]
+        self.assertEqual(detail['count'], 2)
+        self.assertEqual(detail['max_queries'], 6)
+        self.assertEqual([r['path'] for r in report['slow_requests']], ['/api/materials'])
+        self.assertEqual([e['route'] for e in report['n1_suspects']], ['/api/materials'])
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from odoo import fields
 from odoo.tests.common import TransactionCase, tagged
 from odoo.exceptions import ValidationError
 import logging
@@ -52,7 +53,11 @@ class TestKedatechMaterial(TransactionCase):
         self.assertEqual(len(code_parts), 3, "Code should have 3 components")
         self.assertEqual(code_parts[0], 'FBC', "Fabric type should map to FBC")
         self.assertEqual(code_parts[1], 'TM', "Name initials should be 'TM'")
-        self.assertEqual(code_parts[2], str(material.id).zfill(3), "ID should be zero-padded")
+        self.assertTrue(code_parts[2].isdigit() and len(code_parts[2]) >= 3, "Number should be zero-padded")
+
+        # Numbers follow the sequence of the type
+        next_material = self.env['kedatech.material'].create(self.material_vals)
+        self.assertEqual(int(next_material.material_code_kedatech.split('-')[2]), int(code_parts[2]) + 1)
 
         # Test different material types
         type_mapping = {
@@ -84,6 +89,69 @@ class TestKedatechMaterial(TransactionCase):
         
         _logger.info("test_material_code_generation passed.")
 
+    def test_material_batch_creation(self):
+        """Test codes are generated for every record of a batch create"""
+        _logger.info("Starting test_material_batch_creation...")
+
+        vals_list = []
+        for name, mtype in [('Raw Denim', 'jeans_type'), ('Soft Cotton', 'cotton_type'), ('Wool Felt', 'fabric_type')]:
+            vals = self.material_vals.copy()
+            vals.update(name=name, material_type_kedatech=mtype)
+            vals_list.append(vals)
+        materials = self.env['kedatech.material'].create(vals_list)
+
+        self.assertEqual(len(materials), 3)
+        self.assertEqual(
+            [code.rsplit('-', 1)[0] for code in materials.mapped('material_code_kedatech')],
+            ['JNS-RD', 'CTN-SC', 'FBC-WF']
+        )
+
+        # A batch of one type takes consecutive numbers of its sequence
+        materials = self.env['kedatech.material'].create([self.material_vals.copy() for i in range(5)])
+        numbers = [int(code.rsplit('-', 1)[1]) for code in materials.mapped('material_code_kedatech')]
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 5)))
+
+        _logger.info("test_material_batch_creation passed.")
+
+    def test_material_code_unique(self):
+        """Test material codes are unique"""
+        _logger.info("Starting test_material_code_unique...")
+
+        material = self.env['kedatech.material'].create(self.material_vals)
+        other = self.env['kedatech.material'].create(self.material_vals)
+        with self.assertRaises(psycopg2.IntegrityError):
+            self.env.cr.execute('SAVEPOINT test_code_unique')
+            other.write({'material_code_kedatech': material.material_code_kedatech})
+            other.flush()
+        self.env.cr.execute('ROLLBACK TO SAVEPOINT test_code_unique')
+
+        _logger.info("test_material_code_unique passed.")
+
+    def test_material_code_regeneration(self):
+        """Test the code follows changes of name and type"""
+        _logger.info("Starting test_material_code_regeneration...")
+
+        material = self.env['kedatech.material'].create(self.material_vals)
+        number = material.material_code_kedatech.rsplit('-', 1)[1]
+
+        # A rename keeps the number
+        material.write({'name': 'Heavy Wool Felt'})
+        self.assertEqual(material.material_code_kedatech, f"FBC-HWF-{number}")
+
+        # A new type takes a number of the new type
+        jeans = self.env['kedatech.material'].create(dict(self.material_vals, material_type_kedatech='jeans_type'))
+        jeans_number = int(jeans.material_code_kedatech.rsplit('-', 1)[1])
+        material.write({'material_type_kedatech': 'jeans_type'})
+        self.assertEqual(material.material_code_kedatech, f"JNS-HWF-{str(jeans_number + 1).zfill(3)}")
+
+        # Unrelated writes and explicit codes are left alone
+        material.write({'material_price_kedatech': 300.0})
+        self.assertEqual(material.material_code_kedatech, f"JNS-HWF-{str(jeans_number + 1).zfill(3)}")
+        material.write({'name': 'Custom', 'material_code_kedatech': 'CUSTOM-1'})
+        self.assertEqual(material.material_code_kedatech, 'CUSTOM-1')
+
+        _logger.info("test_material_code_regeneration passed.")
+
     def test_price_constraint(self):
         """Test price constraint (must be at least 100)"""
         _logger.info("Starting test_price_constraint...")
@@ -156,4 +224,43 @@ class TestKedatechMaterial(TransactionCase):
                 "Should use explicitly set currency"
             )
             
-        _logger.info("test_currency_default passed.")
\ No newline at end of file
+        _logger.info("test_currency_default passed.")
+
+    def test_company_price(self):
+        """Test the company currency price follows prices and rates"""
+        _logger.info("Starting test_company_price...")
+        company = self.env.company
+        today = fields.Date.today()
+        material = self.env['kedatech.material'].create(self.material_vals)
+        self.assertEqual(material.material_price_company, 150.0)
+
+        other_currency = self.env['res.currency'].with_context(active_test=False).search([
+            ('id', '!=', company.currency_id.id)], limit=1)
+        rate = self.env['res.currency.rate'].search([
+            ('currency_id', '=', other_currency.id), ('name', '=', today), ('company_id', '=', company.id)])
+        if rate:
+            rate.rate = 2.0
+        else:
+            rate = self.env['res.currency.rate'].create({
+                'currency_id': other_currency.id, 'rate': 2.0, 'name': today, 'company_id': company.id})
+
+        foreign = self.env['kedatech.material'].create(dict(
+            self.material_vals, currency_id_kedatech=other_currency.id, material_price_kedatech=300.0))
+        self.assertAlmostEqual(
+            foreign.material_price_company,
+            other_currency._convert(300.0, company.currency_id, company, today))
+
+        # A new rate is applied to the stored prices right away
+        rate.rate = 4.0
+        self.assertAlmostEqual(
+            foreign.material_price_company,
+            other_currency._convert(300.0, company.currency_id, company, today))
+        self.assertEqual(material.material_price_company, 150.0)
+
+        # So is a new price
+        foreign.material_price_kedatech = 600.0
+        self.assertAlmostEqual(
+            foreign.material_price_company,
+            other_currency._convert(600.0, company.currency_id, company, today))
+
+        _logger.info("test_company_price passed.")
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase, tagged
+import base64
+import logging
+
+_logger = logging.getLogger(__name__)
+
+CSV_HEADER = "Material Code,Material Name,Material Type,Material Buy Price,Currency,Supplier's Name\n"
+
+
+@tagged('post_install', '-at_install')
+class TestKedatechMaterialImport(TransactionCase):
+    def setUp(self):
+        super(TestKedatechMaterialImport, self).setUp()
+        _logger.info("Setting up TestKedatechMaterialImport test case...")
+        self.supplier = self.env['res.partner'].create({'name': 'Import Supplier'})
+        self.currency = self.env.company.currency_id
+
+    def _make_job(self, lines, chunk_size=2, **vals):
+        content = CSV_HEADER + ''.join(line + '\n' for line in lines)
+        return self.env['kedatech.material.import'].create(dict(vals, **{
+            'name': 'materials.csv',
+            'import_file': base64.b64encode(content.encode()),
+            'chunk_size': chunk_size,
+        }))
+
+    def test_import_csv(self):
+        """Test a CSV import creates materials and resolves suppliers"""
+        _logger.info("Starting test_import_csv...")
+        job = self._make_job([
+            f"X-1,Cotton Sweatshirt,Cotton,120,{self.currency.name},Import Supplier",
+            f"X-2,Linen Shirt,Fabric,350,{self.currency.name},Import Supplier",
+            f"X-3,Denim Jacket,Jeans,200,{self.currency.name},Brand New Mill",
+        ], create_missing_suppliers=True)
+        job.action_run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, 3)
+        materials = self.env['kedatech.material'].search([('name', 'in', ['Cotton Sweatshirt', 'Linen Shirt', 'Denim Jacket'])])
+        self.assertEqual(len(materials), 3)
+        self.assertEqual(
+            sorted(materials.mapped('material_type_kedatech')), ['cotton_type', 'fabric_type', 'jeans_type'])
+        self.assertIn(self.supplier, materials.mapped('supplier_id_kedatech'))
+        self.assertIn('Brand New Mill', materials.mapped('supplier_id_kedatech.name'))
+
+        _logger.info("test_import_csv passed.")
+
+    def test_import_unknown_supplier(self):
+        """Test unknown suppliers fail the import unless creating them is requested"""
+        _logger.info("Starting test_import_unknown_supplier...")
+        Partner = self.env['res.partner']
+        job = self._make_job([f"X-1,Orphan Material,Cotton,120,{self.currency.name},Unknown Mill"])
+        job.action_run()
+
+        self.assertEqual(job.state, 'failed')
+        self.assertIn('Unknown Mill', job.error)
+        self.assertFalse(Partner.search([('name', '=', 'Unknown Mill')]))
+
+        _logger.info("test_import_unknown_supplier passed.")
+
+    def test_import_resume(self):
+        """Test a failed import resumes from the last committed chunk"""
+        _logger.info("Starting test_import_resume...")
+        Material = self.env['kedatech.material']
+        lines = [f"X-{i},Resumed Material {i},Cotton,150,,Import Supplier" for i in range(4)]
+        job = self._make_job(lines[:2] + ["X-2,Resumed Material 2,Silk,150,,Import Supplier"] + lines[3:])
+        job.action_run()
+
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(job.rows_done, 2)
+        self.assertIn('Silk', job.error)
+        self.assertEqual(Material.search_count([('name', 'like', 'Resumed Material')]), 2)
+
+        job.import_file = base64.b64encode((CSV_HEADER + '\n'.join(lines)).encode())
+        job.action_run()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, 4)
+        self.assertEqual(Material.search_count([('name', 'like', 'Resumed Material')]), 4)
+
+        _logger.info("test_import_resume passed.")
@@ -0,0 +1,4 @@
+from . import compression
+from . import log_utils
+from . import material_cache
+from . import metrics
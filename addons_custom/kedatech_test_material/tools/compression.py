@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Content-Encoding negotiation and compression of API responses.
+
+gzip is always available, brotli only when the ``brotli`` package is
+installed. Bodies under ``MIN_SIZE`` bytes are sent as is: the headers would
+cost more than what compression saves.
+"""
+import zlib
+
+from odoo.tools import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = int(config.get('kedatech_compression_min_size', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate(accept_encodings):
+    """Return the preferred encoding of a werkzeug ``Accept-Encoding`` header, or ``None``."""
+    return accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, flushing after each so clients receive rows progressively."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
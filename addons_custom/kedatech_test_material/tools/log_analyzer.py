@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Per-endpoint performance report from Odoo server logs.
+
+Odoo logs one werkzeug line per request; with the default ``log_handler``
+the line ends with the request's SQL query count, SQL time and remaining
+(Python) time::
+
+    ... INFO db werkzeug: 127.0.0.1 - - [27/May/2025 17:57:49] "GET /web/login HTTP/1.1" 200 - 195 0.057 7.101
+
+The analyzer reads the logs lazily, line by line, in a single pass (plain or
+gzipped, so rotated files can be given as-is) and keeps bounded state per
+endpoint: counters plus a fixed size reservoir sample for the percentiles.
+It does not import Odoo and can be run directly::
+
+    python tools/log_analyzer.py odoo.log odoo.log.1.gz --slow-ms 500 --json
+"""
+import argparse
+import gzip
+import heapq
+import json
+import random
+import re
+import sys
+
+WERKZEUG_RE = re.compile(
+    r'^(?P<timestamp>\S+ \S+) \d+ \w+ \S+ werkzeug: \S+ - - \[[^\]]*\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+) [^"]*" (?P<status>\d{3}) \S+'
+    r'(?: (?P<queries>[\d-]+) (?P<query_time>[\d.-]+) (?P<remaining_time>[\d.-]+))?'
+)
+# "Creating KedatechMaterial with values: ..." or "Creating 3 KedatechMaterial record(s)"
+MATERIAL_CREATE_RE = re.compile(r'kedatech_materials: Creating (?:(\d+) )?KedatechMaterial')
+MATERIAL_ERROR_RE = re.compile(r' ERROR \S+ \S+kedatech_materials: ')
+NUMERIC_SEGMENT_RE = re.compile(r'^\d+(-[0-9a-f]+)?$')
+# Long opaque segments: asset bundle hashes, menu checksums, tokens...
+OPAQUE_SEGMENT_RE = re.compile(r'^[0-9a-f]{16,}$')
+
+RESERVOIR_SIZE = 2000
+PERCENTILES = (50, 95, 99)
+
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def normalize_path(path):
+    """Collapse ids and hashes so that requests of one endpoint group together."""
+    path = path.split('?', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        if NUMERIC_SEGMENT_RE.match(segment):
+            segment = '<id>'
+        elif OPAQUE_SEGMENT_RE.match(segment):
+            segment = '<hash>'
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+def _to_number(value, cast):
+    if value is None or value == '-':
+        return None
+    return cast(value)
+
+
+def parse_line(line):
+    """Return the request described by a werkzeug log line, or ``None``."""
+    match = WERKZEUG_RE.match(line)
+    if not match:
+        return None
+    queries = _to_number(match.group('queries'), int)
+    query_time = _to_number(match.group('query_time'), float)
+    remaining_time = _to_number(match.group('remaining_time'), float)
+    return {
+        'timestamp': match.group('timestamp'),
+        'method': match.group('method'),
+        'path': match.group('path'),
+        'route': normalize_path(match.group('path')),
+        'status': int(match.group('status')),
+        'queries': queries,
+        'query_time': query_time,
+        'duration': None if query_time is None or remaining_time is None else query_time + remaining_time,
+    }
+
+
+class Reservoir(object):
+    """Uniform sample of at most ``size`` values out of an unbounded stream."""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.values = []
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = self.rng.randrange(self.seen)
+            if index < self.size:
+                self.values[index] = value
+
+    def percentiles(self):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        return {
+            f'p{q}': values[max(0, -(-len(values) * q // 100) - 1)]
+            for q in PERCENTILES
+        }
+
+
+class EndpointStats(object):
+
+    def __init__(self, rng):
+        self.count = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.max_queries = 0
+        self.durations = Reservoir(RESERVOIR_SIZE, rng)
+        self.queries = Reservoir(RESERVOIR_SIZE, rng)
+
+    def add(self, request):
+        self.count += 1
+        if request['duration'] is not None:
+            self.total_duration += request['duration']
+            self.max_duration = max(self.max_duration, request['duration'])
+            self.durations.add(request['duration'])
+        if request['queries'] is not None:
+            self.max_queries = max(self.max_queries, request['queries'])
+            self.queries.add(request['queries'])
+
+    def report(self):
+        timed = self.durations.seen
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_duration / timed * 1000, 1) if timed else None,
+            'max_ms': round(self.max_duration * 1000, 1) if timed else None,
+            'latency_ms': {
+                key: round(value * 1000, 1) for key, value in (self.durations.percentiles() or {}).items()
+            } or None,
+            'queries': self.queries.percentiles(),
+            'max_queries': self.max_queries if self.queries.seen else None,
+        }
+
+
+class LogAnalyzer(object):
+    """Aggregate werkzeug request lines per (method, route, status).
+
+    Memory is bounded by the number of distinct endpoints: each keeps
+    counters and two reservoirs, and only the ``top`` slowest requests are
+    retained.
+    """
+
+    def __init__(self, slow_ms=1000, n1_queries=50, top=20, seed=0):
+        self.slow_threshold = slow_ms / 1000.0
+        self.n1_queries = n1_queries
+        self.top = top
+        self.rng = random.Random(seed)
+        self.endpoints = {}
+        self.slowest = []
+        self.lines = 0
+        self.requests = 0
+        self.material_events = {'create': 0, 'errors': 0}
+
+    def feed(self, lines):
+        for line in lines:
+            self.lines += 1
+            if 'werkzeug: ' not in line:
+                create = MATERIAL_CREATE_RE.search(line)
+                if create:
+                    self.material_events['create'] += int(create.group(1) or 1)
+                elif MATERIAL_ERROR_RE.search(line):
+                    self.material_events['errors'] += 1
+                continue
+            request = parse_line(line)
+            if request is None:
+                continue
+            self.requests += 1
+            key = (request['method'], request['route'], request['status'])
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats(self.rng)
+            stats.add(request)
+
+            duration = request['duration']
+            if duration is not None and duration >= self.slow_threshold:
+                item = (duration, self.requests, request)
+                if len(self.slowest) < self.top:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+        return self
+
+    def report(self):
+        endpoints = []
+        for (method, route, status), stats in self.endpoints.items():
+            data = stats.report()
+            data.update(method=method, route=route, status=status)
+            endpoints.append(data)
+        endpoints.sort(key=lambda e: (e['avg_ms'] or 0) * e['count'], reverse=True)
+
+        # Endpoints whose query count reaches the threshold most likely run
+        # one query per record (N+1) instead of batched reads
+        n1_suspects = [
+            {'method': e['method'], 'route': e['route'], 'status': e['status'],
+             'max_queries': e['max_queries'], 'queries': e['queries']}
+            for e in endpoints
+            if e['max_queries'] is not None and e['max_queries'] >= self.n1_queries
+        ]
+        return {
+            'lines': self.lines,
+            'requests': self.requests,
+            'material_events': self.material_events,
+            'endpoints': endpoints,
+            'slow_requests': [
+                {'timestamp': r['timestamp'], 'method': r['method'], 'path': r['path'], 'status': r['status'],
+                 'duration_ms': round(duration * 1000, 1), 'queries': r['queries']}
+                for duration, _seq, r in sorted(self.slowest, key=lambda item: item[0], reverse=True)
+            ],
+            'n1_suspects': n1_suspects,
+        }
+
+
+def format_report(report, limit=30):
+    lines = [
+        f"{report['lines']} lines, {report['requests']} requests, "
+        f"{report['material_events']['create']} material creates, "
+        f"{report['material_events']['errors']} material errors",
+        '',
+        f"{'method':<7}{'status':<7}{'count':>7}{'avg ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'q p95':>7}  route",
+    ]
+    for e in report['endpoints'][:limit]:
+        latency = e['latency_ms'] or {}
+        queries = e['queries'] or {}
+        lines.append(
+            f"{e['method']:<7}{e['status']:<7}{e['count']:>7}{_fmt(e['avg_ms']):>10}"
+            f"{_fmt(latency.get('p50')):>9}{_fmt(latency.get('p95')):>9}{_fmt(latency.get('p99')):>9}"
+            f"{_fmt(queries.get('p95')):>7}  {e['route']}"
+        )
+    if report['slow_requests']:
+        lines += ['', 'Slowest requests:']
+        lines += [
+            f"  {r['duration_ms']:>9} ms {_fmt(r['queries']):>5} q  {r['timestamp']}  {r['method']} {r['path']} {r['status']}"
+            for r in report['slow_requests']
+        ]
+    if report['n1_suspects']:
+        lines += ['', 'Possible N+1 query patterns:']
+        lines += [
+            f"  {e['method']} {e['route']} {e['status']}: up to {e['max_queries']} queries"
+            for e in report['n1_suspects']
+        ]
+    return '\n'.join(lines)
+
+
+def _fmt(value):
+    return '-' if value is None else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('logs', nargs='+', help="log files, plain or .gz, '-' for stdin")
+    parser.add_argument('--slow-ms', type=float, default=1000, help="slow request threshold (default: 1000)")
+    parser.add_argument('--n1-queries', type=int, default=50,
+                        help="query count flagging a possible N+1 pattern (default: 50)")
+    parser.add_argument('--top', type=int, default=20, help="number of slow requests to list (default: 20)")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    analyzer = LogAnalyzer(slow_ms=args.slow_ms, n1_queries=args.n1_queries, top=args.top)
+    for path in args.logs:
+        with open_log(path) as stream:
+            analyzer.feed(stream)
+    report = analyzer.report()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
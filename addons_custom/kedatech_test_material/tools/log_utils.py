@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Logging helpers for the material hot paths.
+
+``log_throttled`` caps how many messages a hot-path event emits per time
+window and reports how many were dropped. ``install_async_handlers`` moves
+the root handlers' I/O to a background thread so request workers never wait
+on the log file.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+THROTTLE_INTERVAL = float(config.get('kedatech_log_throttle_interval', 10))
+THROTTLE_BURST = int(config.get('kedatech_log_throttle_burst', 20))
+
+_throttle = {}
+_throttle_lock = threading.Lock()
+_listeners = {}
+
+
+def log_throttled(logger, level, key, msg, *args):
+    """Log ``msg % args`` at most ``THROTTLE_BURST`` times per interval for ``key``.
+
+    Nothing is formatted when ``level`` is disabled, and the first message
+    of the next window carries the number of suppressed ones.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    with _throttle_lock:
+        window_start, emitted, suppressed = _throttle.get(key, (now, 0, 0))
+        if now - window_start >= THROTTLE_INTERVAL:
+            window_start, emitted = now, 0
+        if emitted >= THROTTLE_BURST:
+            _throttle[key] = (window_start, emitted, suppressed + 1)
+            return
+        _throttle[key] = (window_start, emitted + 1, 0)
+    if suppressed:
+        msg += " (%d similar messages suppressed)"
+        args += (suppressed,)
+    logger.log(level, msg, *args)
+
+
+def install_async_handlers(logger=None):
+    """Route the handlers of ``logger`` (the root logger by default) through queues.
+
+    Records are still formatted in the emitting thread, where Odoo's
+    formatter finds the database name, and only the write is done by a
+    ``QueueListener`` thread. Calling it twice is a no-op.
+    """
+    logger = logger or logging.getLogger()
+    if logger.name in _listeners:
+        return
+    installed = []
+    for handler in list(logger.handlers):
+        records = queue.Queue(-1)
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.setLevel(handler.level)
+        queue_handler.setFormatter(handler.formatter)
+        for log_filter in handler.filters:
+            queue_handler.addFilter(log_filter)
+        formatter = handler.formatter
+        # The message arrives formatted already
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+        listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        listener.start()
+        installed.append((queue_handler, listener, handler, formatter))
+        logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+    _listeners[logger.name] = installed
+    _logger.info("Asynchronous logging enabled for %s handler(s) of %s", len(installed), logger.name)
+
+
+def uninstall_async_handlers(logger=None):
+    """Flush the queues of ``logger`` and put its original handlers back."""
+    logger = logger or logging.getLogger()
+    for queue_handler, listener, handler, formatter in _listeners.pop(logger.name, []):
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+
+
+@atexit.register
+def _stop_async_handlers():
+    # Flush what is still queued before the process exits
+    for installed in _listeners.values():
+        for queue_handler, listener, handler, formatter in installed:
+            listener.stop()
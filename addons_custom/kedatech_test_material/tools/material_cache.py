@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Per-worker caches for kedatech.material API payloads.
+
+Each worker keeps its own LRU caches. Writes invalidate the local entries
+right away and, once the transaction is committed, insert a row numbered by
+a PostgreSQL sequence into a signal table. Before using its caches a worker
+reads the highest signal visible in its transaction's snapshot and flushes
+them when it moved.
+
+Reading the signal from a table, rather than the sequence itself, ties it to
+the data the transaction sees: a signal is only visible to snapshots that
+also see the write it stands for. Entries are only stored from transactions
+whose snapshot is as recent as the last signal the worker knows of and that
+did not write materials or rates themselves, so the caches only ever hold
+committed data.
+"""
+from collections import OrderedDict
+from functools import partial
+import logging
+import threading
+import time
+import weakref
+
+from odoo import sql_db
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+SIGNAL_SEQUENCE = 'kedatech_material_cache_signaling'
+SIGNAL_TABLE = 'kedatech_material_cache_signal'
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+# Serialized GET /api/materials/<id> payloads, keyed by (dbname, material id)
+payload_cache = LRUCache(
+    int(config.get('kedatech_material_cache_size', 4096)),
+    float(config.get('kedatech_material_cache_ttl', 300)),
+)
+
+# Aggregates of GET /api/materials/stats, keyed by (dbname, domain, group_by).
+# Any material change may affect any aggregate, so writes clear it entirely.
+stats_cache = LRUCache(
+    int(config.get('kedatech_material_stats_cache_size', 256)),
+    float(config.get('kedatech_material_cache_ttl', 300)),
+)
+
+# Ranked ids of GET /api/materials/search, keyed by (dbname, query, limit).
+# Like the aggregates, any material change may reorder any result.
+search_cache = LRUCache(
+    int(config.get('kedatech_material_search_cache_size', 1024)),
+    float(config.get('kedatech_material_search_cache_ttl', 60)),
+)
+
+# Currency rates converting material prices, keyed by (dbname, currency id,
+# company id, date). Cleared whenever a res.currency.rate changes.
+rate_cache = LRUCache(
+    int(config.get('kedatech_rate_cache_size', 1024)),
+    float(config.get('kedatech_rate_cache_ttl', 3600)),
+)
+
+_caches = [payload_cache, stats_cache, search_cache, rate_cache]
+_signals = {}
+_signals_lock = threading.Lock()
+# Per cursor, until its transaction ends: the signal its snapshot sees
+# ('signal') and whether it changed materials or rates ('dirty')
+_transactions = weakref.WeakKeyDictionary()
+
+
+def create_signal_table(cr):
+    cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {SIGNAL_SEQUENCE}")
+    cr.execute(f"CREATE TABLE IF NOT EXISTS {SIGNAL_TABLE} (id bigint PRIMARY KEY)")
+
+
+def check_signal(cr):
+    """Return the signal visible to the transaction of ``cr``, flushing stale local caches.
+
+    The signal is read once per transaction. When it moved past the last one
+    the worker knows of, another worker committed material changes.
+    """
+    transaction = _transaction(cr)
+    if 'signal' in transaction:
+        return transaction['signal']
+    cr.execute(f"SELECT coalesce(max(id), 0) FROM {SIGNAL_TABLE}")
+    value = transaction['signal'] = cr.fetchone()[0]
+    with _signals_lock:
+        previous = _signals.get(cr.dbname)
+        if previous is None or value > previous:
+            _signals[cr.dbname] = value
+            if previous is not None:
+                _logger.debug("Material caches invalidated by another worker (%s -> %s)", previous, value)
+                _clear_local()
+    return value
+
+
+def lookup(cr, cache, key):
+    """Return the entry of ``key`` in ``cache`` or ``None``, never from a transaction that wrote."""
+    check_signal(cr)
+    if _transaction(cr).get('dirty'):
+        return None
+    return cache.get(key)
+
+
+def store(cr, cache, key, value):
+    """Put ``value`` in ``cache`` if the data read by ``cr`` is known to be committed and current."""
+    signal = check_signal(cr)
+    if _transaction(cr).get('dirty'):
+        return
+    with _signals_lock:
+        # An older snapshot may miss changes another transaction already signalled
+        if _signals.get(cr.dbname) == signal:
+            cache.put(key, value)
+
+
+def invalidate(env, ids):
+    """Drop ``ids`` from the local caches and signal the other workers on commit."""
+    transaction = _dirty_transaction(env.cr)
+    if transaction['ids'] is not None:
+        transaction['ids'].update(ids)
+    _pop_local(env.cr.dbname, ids)
+
+
+def invalidate_all(env):
+    """Clear every local cache and signal the other workers on commit."""
+    _dirty_transaction(env.cr)['ids'] = None
+    _clear_local()
+
+
+def _transaction(cr):
+    with _signals_lock:
+        transaction = _transactions.get(cr)
+        if transaction is None:
+            transaction = _transactions[cr] = {}
+            cr.after('commit', partial(_forget_transaction, cr))
+            cr.after('rollback', partial(_forget_transaction, cr))
+    return transaction
+
+
+def _dirty_transaction(cr):
+    """Return the state of the transaction of ``cr``, marked as having written.
+
+    The commit and rollback hooks are registered by the first write only, the
+    ids changed by the transaction (``None`` for all) are collected so that a
+    single signal is sent however many writes it made.
+    """
+    transaction = _transaction(cr)
+    if not transaction.get('dirty'):
+        transaction['dirty'] = True
+        transaction['ids'] = set()
+        cr.after('commit', partial(_signal_commit, cr.dbname, transaction))
+        cr.after('rollback', partial(_rollback_local, cr.dbname, transaction))
+    return transaction
+
+
+def _forget_transaction(cr):
+    with _signals_lock:
+        _transactions.pop(cr, None)
+
+
+def _clear_local():
+    for cache in _caches:
+        cache.clear()
+
+
+def _pop_local(dbname, ids):
+    for material_id in ids:
+        payload_cache.pop((dbname, material_id))
+    stats_cache.clear()
+    search_cache.clear()
+
+
+def _rollback_local(dbname, transaction):
+    if transaction['ids'] is None:
+        _clear_local()
+    else:
+        _pop_local(dbname, transaction['ids'])
+
+
+def _signal_commit(dbname, transaction):
+    # The number is taken after the commit, so a snapshot seeing signal N
+    # also sees every write whose signal is lower than N. The request cursor
+    # is between transactions here, the row is inserted on its own cursor.
+    ids = transaction['ids']
+    with sql_db.db_connect(dbname).cursor() as cr:
+        cr.execute(f"INSERT INTO {SIGNAL_TABLE} (id) VALUES (nextval('{SIGNAL_SEQUENCE}')) RETURNING id")
+        value = cr.fetchone()[0]
+    with _signals_lock:
+        previous = _signals.get(dbname)
+        _signals[dbname] = max(value, previous or 0)
+        # Entries read by this worker between the write and the commit may be
+        # stale; updating the signal first stops older snapshots from storing more
+        if ids is None or (previous is not None and previous != value - 1):
+            # Another worker may have signalled in between as well
+            _clear_local()
+        else:
+            _pop_local(dbname, ids)
+
+
+def gc_signals(cr, keep=1000):
+    """Delete all but the last ``keep`` signals, only the highest one is ever read."""
+    cr.execute(f"DELETE FROM {SIGNAL_TABLE} WHERE id < (SELECT max(id) FROM {SIGNAL_TABLE}) - %s", [keep])
+
+
+def stats():
+    return {
+        'payload': payload_cache.stats(),
+        'stats': stats_cache.stats(),
+        'search': search_cache.stats(),
+        'rates': rate_cache.stats(),
+    }
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Per-route instrumentation of the material API.
+
+``instrumented`` wraps a controller method and records, for every call, the
+SQL query count and time (from the counters Odoo keeps on the request
+thread), the JSON serialization time and the payload size. The figures are
+sent back in a ``Server-Timing`` header and kept in rolling windows from
+which percentiles are computed on demand.
+"""
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import functools
+import logging
+import threading
+import time
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = int(config.get('kedatech_metrics_window', 1000))
+METRICS = ('total_ms', 'sql_ms', 'sql_queries', 'serialization_ms', 'payload_bytes')
+PERCENTILES = (50, 95, 99)
+
+_samples = defaultdict(lambda: {metric: deque(maxlen=WINDOW_SIZE) for metric in METRICS})
+_counts = defaultdict(int)
+_lock = threading.Lock()
+
+
+@contextmanager
+def measure_serialization():
+    """Add the time spent in the block to the serialization time of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        thread = threading.current_thread()
+        thread.kedatech_serialization_time = (
+            getattr(thread, 'kedatech_serialization_time', 0.0) + time.perf_counter() - start)
+
+
+def instrumented(func):
+    """Record query count, SQL time, serialization time and payload size of ``func``."""
+    route = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        thread = threading.current_thread()
+        query_count = getattr(thread, 'query_count', 0)
+        query_time = getattr(thread, 'query_time', 0.0)
+        thread.kedatech_serialization_time = 0.0
+        start = time.perf_counter()
+
+        response = func(*args, **kwargs)
+
+        sample = {
+            'total_ms': (time.perf_counter() - start) * 1000,
+            'sql_ms': (getattr(thread, 'query_time', 0.0) - query_time) * 1000,
+            'sql_queries': getattr(thread, 'query_count', 0) - query_count,
+            'serialization_ms': thread.kedatech_serialization_time * 1000,
+            # Streamed bodies are produced after the handler returns
+            'payload_bytes': None if response.is_streamed else len(response.get_data()),
+        }
+        record(route, sample)
+        response.headers['Server-Timing'] = ', '.join([
+            'sql;dur=%.3f;desc="%d queries"' % (sample['sql_ms'], sample['sql_queries']),
+            'ser;dur=%.3f' % sample['serialization_ms'],
+            'total;dur=%.3f' % sample['total_ms'],
+        ])
+        return response
+
+    return wrapper
+
+
+def record(route, sample):
+    with _lock:
+        _counts[route] += 1
+        samples = _samples[route]
+        for metric, value in sample.items():
+            if value is not None:
+                samples[metric].append(value)
+
+
+def _percentile(values, q):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, -(-len(values) * q // 100) - 1)
+    return round(values[int(index)], 3)
+
+
+def snapshot():
+    """Return p50/p95/p99 of every metric of every route over the rolling window."""
+    with _lock:
+        samples = {route: {m: sorted(values) for m, values in metrics.items()} for route, metrics in _samples.items()}
+        counts = dict(_counts)
+    result = {}
+    for route, metrics in samples.items():
+        result[route] = {'count': counts[route], 'window': len(metrics['total_ms'])}
+        for metric, values in metrics.items():
+            result[route][metric] = {
+                f'p{q}': _percentile(values, q) for q in PERCENTILES
+            } if values else None
+    return result
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _counts.clear()